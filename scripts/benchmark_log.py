@@ -0,0 +1,302 @@
+# This file contains the code shared by the viewer scripts for loading the JSON
+# log written by the runner for a single benchmark instance. Rather than
+# keeping the parsed dict, a log is converted into a "struct of arrays": one
+# numpy array per kernel or block property, instead of one Python object per
+# kernel or block. Each block then takes roughly 18 bytes: two float64 times
+# and a uint16 SM ID.
+#
+# Usage, from another script in this directory:
+#
+#    import benchmark_log
+#    benchmarks = benchmark_log.load_benchmark_logs(filenames)
+#    scenarios = benchmark_log.group_by_scenario(benchmarks)
+import kernel_index
+import log_parser
+import mmap
+import multiprocessing
+import numpy
+import os
+
+# The keys in the "times" array entries containing a [start, end] pair of CPU
+# times, recorded once per iteration.
+CPU_TIMES_KEYS = ["copy_in_times", "execute_times", "copy_out_times",
+    "cpu_times"]
+
+# The number of threads and bytes of shared memory available on each SM.
+SM_THREADS = 2048
+SM_SHARED_MEM = 65536
+
+# The capacity of an SM in each resource whose use the viewers can show, by the
+# names given to their --resource options.
+SM_CAPACITY = {"threads": SM_THREADS, "sharedmem": SM_SHARED_MEM}
+
+class BenchmarkLog(object):
+    """Holds the contents of a single benchmark's JSON log. Header values are
+    attributes, set to None if they were missing from the log. Per-kernel and
+    per-block values are held in numpy arrays. The blocks for kernel i are at
+    indices block_offsets[i] up to (but not including) block_offsets[i + 1] in
+    the block arrays. Each kernel's kernel_iteration is the index of the
+    iteration (the preceding CPU times entry) it was launched in, or -1 if no
+    CPU times preceded it. CPU times are kept in arrays with one [start, end]
+    row per iteration. If the log ended part way through (for example, because
+    the benchmark was still running), truncated is True."""
+    __slots__ = ["filename", "truncated", "scenario_name", "benchmark_name",
+        "label", "max_resident_threads", "data_size", "release_time", "pid",
+        "tid",
+        "kernel_names", "kernel_name_ids", "kernel_start", "kernel_end",
+        "thread_count", "shared_memory", "cpu_core", "kernel_iteration",
+        "block_offsets", "block_start", "block_end", "block_smid",
+        "copy_in_times", "execute_times", "copy_out_times", "cpu_times"]
+
+    def __getstate__(self):
+        return [getattr(self, k) for k in self.__slots__]
+
+    def __setstate__(self, state):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    def kernel_count(self):
+        return len(self.kernel_start)
+
+    def block_count(self):
+        return len(self.block_start)
+
+    def iteration_count(self):
+        return len(self.cpu_times)
+
+    def get_kernel_name(self, i):
+        """Returns the name of the i-th kernel, or None if it wasn't named."""
+        return self.kernel_names[self.kernel_name_ids[i]]
+
+    def get_kernel_blocks(self, i):
+        """Returns a slice selecting the i-th kernel's blocks from any of the
+        block arrays."""
+        return slice(self.block_offsets[i], self.block_offsets[i + 1])
+
+    def get_block_thread_counts(self):
+        """Returns an array containing the number of threads in each block."""
+        return numpy.repeat(self.thread_count, numpy.diff(self.block_offsets))
+
+    def get_block_shared_memory(self):
+        """Returns an array containing the shared memory used by each block's
+        kernel."""
+        return numpy.repeat(self.shared_memory, numpy.diff(self.block_offsets))
+
+    def get_block_usage(self, resource):
+        """Returns an array holding the amount of the given resource (a key of
+        SM_CAPACITY) used by each block."""
+        if resource == "threads":
+            return self.get_block_thread_counts()
+        if resource == "sharedmem":
+            return self.get_block_shared_memory()
+        raise ValueError("Unknown resource: %s" % resource)
+
+    def get_times(self, times_key):
+        """Returns a 2-D array with one [start, end] row for every entry of the
+        given key in the log's "times" array. For block_times, there is one row
+        per block."""
+        if times_key == "block_times":
+            return numpy.column_stack((self.block_start, self.block_end))
+        if times_key == "kernel_times":
+            return numpy.column_stack((self.kernel_start, self.kernel_end))
+        if times_key in CPU_TIMES_KEYS:
+            return getattr(self, times_key)
+        raise ValueError("Unknown times key: %s" % times_key)
+
+    def get_durations(self, times_key):
+        """Returns an array of the end - start durations for every interval of
+        the given key, in seconds."""
+        times = self.get_times(times_key)
+        return times[:, 1] - times[:, 0]
+
+    def get_kernel_name_ids(self, times_key):
+        """Returns an array holding the index of the kernel name (in
+        kernel_names) of each duration of the given times key, or None if the
+        key is recorded once per iteration rather than per kernel or block."""
+        if times_key == "kernel_times":
+            return self.kernel_name_ids
+        if times_key == "block_times":
+            return numpy.repeat(self.kernel_name_ids,
+                numpy.diff(self.block_offsets))
+        return None
+
+class BenchmarkLogBuilder(object):
+    """Accumulates the header dict and "times" entries from a log and converts
+    them into a BenchmarkLog. Block arrays are gathered in chunks and
+    concatenated once at the end, so no per-block Python objects are kept."""
+    def __init__(self, header, filename=None):
+        self.header = header
+        self.filename = filename
+        self.kernel_names = []
+        self.kernel_name_lookup = {}
+        self.kernel_name_ids = []
+        self.kernel_times = []
+        self.thread_counts = []
+        self.shared_memory = []
+        self.cpu_cores = []
+        self.kernel_iterations = []
+        self.block_counts = []
+        self.block_times = []
+        self.block_smids = []
+        self.cpu_times = dict((k, []) for k in CPU_TIMES_KEYS)
+
+    def add_entry(self, entry):
+        """Adds a single (parsed) object from the log's "times" array."""
+        if "cpu_times" in entry:
+            for k in CPU_TIMES_KEYS:
+                self.cpu_times[k].append(entry.get(k, entry["cpu_times"]))
+            return
+        # The first entry in the times array is an empty object.
+        if not "block_times" in entry:
+            return
+        name = entry.get("kernel_name")
+        if not name in self.kernel_name_lookup:
+            self.kernel_name_lookup[name] = len(self.kernel_names)
+            self.kernel_names.append(name)
+        self.kernel_name_ids.append(self.kernel_name_lookup[name])
+        self.kernel_times.append(entry["kernel_times"])
+        self.thread_counts.append(entry["thread_count"])
+        self.shared_memory.append(entry.get("shared_memory", 0))
+        self.cpu_cores.append(entry.get("cpu_core", -1))
+        self.kernel_iterations.append(len(self.cpu_times["cpu_times"]) - 1)
+        block_times = numpy.asarray(entry["block_times"], dtype=numpy.float64)
+        self.block_counts.append(len(block_times) // 2)
+        self.block_times.append(block_times)
+        self.block_smids.append(numpy.asarray(entry["block_smids"],
+            dtype=numpy.uint16))
+
+    def finish(self, truncated=False):
+        """Returns the BenchmarkLog containing every entry added so far. The
+        header is only read now, since fields may follow the times array."""
+        log = BenchmarkLog()
+        log.filename = self.filename
+        log.truncated = truncated
+        log.scenario_name = self.header.get("scenario_name")
+        log.benchmark_name = self.header.get("benchmark_name")
+        log.label = self.header.get("label")
+        log.max_resident_threads = self.header.get("max_resident_threads")
+        log.data_size = self.header.get("data_size")
+        log.release_time = self.header.get("release_time")
+        log.pid = self.header.get("PID")
+        log.tid = self.header.get("TID")
+        log.kernel_names = self.kernel_names
+        log.kernel_name_ids = numpy.array(self.kernel_name_ids,
+            dtype=numpy.int32)
+        kernel_times = numpy.array(self.kernel_times,
+            dtype=numpy.float64).reshape((-1, 2))
+        log.kernel_start = kernel_times[:, 0].copy()
+        log.kernel_end = kernel_times[:, 1].copy()
+        log.thread_count = numpy.array(self.thread_counts, dtype=numpy.int32)
+        log.shared_memory = numpy.array(self.shared_memory, dtype=numpy.int32)
+        log.cpu_core = numpy.array(self.cpu_cores, dtype=numpy.int32)
+        log.kernel_iteration = numpy.array(self.kernel_iterations,
+            dtype=numpy.int32)
+        log.block_offsets = numpy.zeros(len(self.block_counts) + 1,
+            dtype=numpy.int64)
+        log.block_offsets[1:] = numpy.cumsum(self.block_counts)
+        block_times = numpy.concatenate([numpy.zeros(0)] + self.block_times)
+        log.block_start = block_times[0::2].copy()
+        log.block_end = block_times[1::2].copy()
+        log.block_smid = numpy.concatenate([numpy.zeros(0, dtype=numpy.uint16)]
+            + self.block_smids)
+        for k in CPU_TIMES_KEYS:
+            setattr(log, k, numpy.array(self.cpu_times[k],
+                dtype=numpy.float64).reshape((-1, 2)))
+        return log
+
+def parse_benchmark_log(parsed, filename=None):
+    """Takes a log which has already been parsed into a dict and returns a
+    BenchmarkLog."""
+    builder = BenchmarkLogBuilder(parsed, filename)
+    for entry in parsed.get("times", []):
+        builder.add_entry(entry)
+    return builder.finish()
+
+def load_benchmark_log(filename, cache=None, window=None):
+    """Reads the JSON log at the given path and returns a BenchmarkLog. The log
+    is decoded one entry at a time, and may be truncated. If a LogCache is
+    given, the log is loaded from the cache if it holds an up-to-date copy,
+    and added to the cache otherwise. If window is a (start, end) pair of
+    times, only the kernels overlapping it are loaded, using load_window."""
+    if window is not None:
+        return load_window(filename, window[0], window[1], cache)
+    if cache is not None:
+        fields = cache.load(filename)
+        if fields is not None:
+            log = BenchmarkLog()
+            try:
+                for k in BenchmarkLog.__slots__:
+                    setattr(log, k, fields[k])
+                log.filename = filename
+                return log
+            except KeyError:
+                pass
+        status = os.stat(filename)
+    with open(filename) as f:
+        parser = log_parser.LogParser(f)
+        builder = BenchmarkLogBuilder(parser.header, filename)
+        for entry in parser:
+            builder.add_entry(entry)
+    log = builder.finish(parser.truncated)
+    if cache is not None:
+        cache.store(filename, status, dict((k, getattr(log, k))
+            for k in BenchmarkLog.__slots__))
+    return log
+
+def load_window(filename, start_time, end_time, cache=None):
+    """Returns a BenchmarkLog containing only the kernels in the log at the
+    given path which overlap the given range of times, along with the CPU
+    times of their iterations. Either time may be None to leave the range
+    unbounded. The log's KernelIndex is used to decode just the entries
+    needed, directly from a memory map of the file."""
+    index = kernel_index.get_kernel_index(filename, cache)
+    builder = BenchmarkLogBuilder(index.header, filename)
+    entries = index.find_entries(start_time, end_time)
+    if len(entries) != 0:
+        with open(filename, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for i in entries:
+                    start = index.entry_offset[i]
+                    end = start + index.entry_length[i]
+                    builder.add_entry(log_parser.decode_entry(data[start:end]))
+            finally:
+                data.close()
+    return builder.finish(index.truncated)
+
+def load_benchmark_log_args(args):
+    """Calls load_benchmark_log with a tuple of arguments, for use with a
+    multiprocessing pool."""
+    return load_benchmark_log(*args)
+
+def load_benchmark_logs(filenames, cache=None, jobs=1, window=None):
+    """Takes a list of filenames and returns a list of BenchmarkLogs, one per
+    file. The cache and window arguments are passed to load_benchmark_log for
+    each file. The files are loaded by a pool of the given number of
+    processes, or one process per CPU if jobs is None. Each process returns
+    its BenchmarkLogs' arrays as binary buffers, rather than as decoded
+    JSON."""
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(filenames))
+    if jobs <= 1:
+        return [load_benchmark_log(name, cache, window) for name in filenames]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        logs = pool.map(load_benchmark_log_args,
+            [(name, cache, window) for name in filenames], 1)
+    finally:
+        pool.close()
+        pool.join()
+    return logs
+
+def group_by_scenario(benchmarks):
+    """Takes a list of BenchmarkLogs and returns a dict mapping each scenario
+    name to the list of benchmarks belonging to the scenario."""
+    scenarios = {}
+    for benchmark in benchmarks:
+        scenario = benchmark.scenario_name
+        if not scenario in scenarios:
+            scenarios[scenario] = []
+        scenarios[scenario].append(benchmark)
+    return scenarios
@@ -0,0 +1,184 @@
+# This script compares the durations recorded in two directories of JSON result
+# files, such as an isolated and an interference run of the same benchmarks.
+# Benchmarks are paired by scenario name and label, and for each pair, the
+# script reports the slowdown: the ratio of a statistic (the median, by
+# default) of the second directory's durations to that of the first's. Each
+# slowdown comes with a bootstrap confidence interval, and a Mann-Whitney U
+# test of whether either set of durations tends to be larger. A pair is
+# flagged as a regression if the test is significant and the whole confidence
+# interval is above 1, or as an improvement if it's below 1.
+#
+# Usage: python compare_results.py [options] baseline_directory directory
+#
+# The table is written to stdout as JSON unless --output or --format is given,
+# and the regressions are listed on stderr. Run with --help to list the
+# options.
+import argparse
+import collections
+import latency_report
+import latency_stats
+import multiprocessing
+import numpy
+import sys
+import viewer_options
+
+# The columns of the comparison, in order.
+COMPARISON_COLUMNS = ["scenario", "label", "times_key", "statistic",
+    "baseline_count", "count", "baseline_value", "value", "slowdown",
+    "slowdown_low", "slowdown_high", "u", "p_value", "result"]
+
+def get_durations(benchmarks, times_key, ignore_scenario):
+    """Takes a list of BenchmarkLogs, and returns a dict mapping each
+    (scenario, label) pair to an array of the durations of the given times key
+    from every benchmark with that scenario name and label. If ignore_scenario
+    is True, the scenario is None in every pair, so benchmarks are matched by
+    label alone."""
+    durations = {}
+    for b in benchmarks:
+        key = (None if ignore_scenario else b.scenario_name, b.label)
+        if not key in durations:
+            durations[key] = []
+        durations[key].append(b.get_durations(times_key))
+    return dict((k, numpy.concatenate(v)) for k, v in durations.items())
+
+def get_bootstrap_ratios_args(args):
+    """Calls latency_stats.get_bootstrap_ratios with a tuple of arguments, for
+    use with a multiprocessing pool."""
+    return latency_stats.get_bootstrap_ratios(*args)
+
+def get_slowdown_intervals(pairs, args):
+    """Takes a list of (baseline, values) pairs of duration arrays, and returns
+    a list of (low, high) bootstrap confidence intervals of the slowdown of
+    each pair. The resamples of every pair are split between a pool of --jobs
+    processes, or one process per CPU, each with its own seed."""
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, args.resamples))
+    work = []
+    for i in range(len(pairs)):
+        for j in range(jobs):
+            resamples = args.resamples // jobs
+            if j < args.resamples % jobs:
+                resamples += 1
+            work.append((pairs[i][0], pairs[i][1], args.statistic, resamples,
+                args.seed + i * jobs + j))
+    if jobs <= 1:
+        ratios = [get_bootstrap_ratios_args(w) for w in work]
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            ratios = pool.map(get_bootstrap_ratios_args, work, 1)
+        finally:
+            pool.close()
+            pool.join()
+    tail = (1.0 - args.confidence) * 50.0
+    intervals = []
+    for i in range(len(pairs)):
+        replicates = numpy.concatenate(ratios[i * jobs:(i + 1) * jobs])
+        low, high = numpy.percentile(replicates, [tail, 100.0 - tail])
+        intervals.append((float(low), float(high)))
+    return intervals
+
+def compare_results(baseline_benchmarks, benchmarks, args):
+    """Returns a list of comparison rows, each a dict mapping the names in
+    COMPARISON_COLUMNS to values, for every scenario and label found in both
+    lists of BenchmarkLogs."""
+    baseline = get_durations(baseline_benchmarks, args.times_key,
+        args.ignore_scenario)
+    current = get_durations(benchmarks, args.times_key, args.ignore_scenario)
+    keys = sorted(k for k in baseline if (k in current) and
+        (len(baseline[k]) != 0) and (len(current[k]) != 0))
+    pairs = [(baseline[k], current[k]) for k in keys]
+    intervals = get_slowdown_intervals(pairs, args)
+    rows = []
+    for i in range(len(keys)):
+        baseline_values, values = pairs[i]
+        baseline_value = float(latency_stats.get_statistic(
+            baseline_values[None, :], args.statistic)[0])
+        value = float(latency_stats.get_statistic(values[None, :],
+            args.statistic)[0])
+        u, p = latency_stats.mann_whitney_u(baseline_values, values)
+        low, high = intervals[i]
+        result = ""
+        if p < args.alpha and low > 1.0:
+            result = "regression"
+        elif p < args.alpha and high < 1.0:
+            result = "improvement"
+        row = collections.OrderedDict()
+        row["scenario"], row["label"] = keys[i]
+        row["times_key"] = args.times_key
+        row["statistic"] = args.statistic
+        row["baseline_count"] = len(baseline_values)
+        row["count"] = len(values)
+        row["baseline_value"] = baseline_value
+        row["value"] = value
+        row["slowdown"] = value / baseline_value
+        row["slowdown_low"] = low
+        row["slowdown_high"] = high
+        row["u"] = u
+        row["p_value"] = p
+        row["result"] = result
+        rows.append(row)
+    return rows
+
+def write_csv(rows, f):
+    """Writes the comparison rows to the given file as CSV."""
+    latency_stats.write_csv(rows, f, COMPARISON_COLUMNS)
+
+# The formats the comparison may be written in, by file extension.
+COMPARISON_WRITERS = {
+    "json": latency_stats.write_json,
+    "csv": write_csv,
+}
+
+if __name__ == "__main__":
+    parser = viewer_options.get_argument_parser("Compares the durations of " +
+        "the benchmarks in two directories of result files.")
+    parser.add_argument("other_directory",
+        help="The directory containing the result files to compare with " +
+        "those in the first directory, which is the baseline.")
+    parser.add_argument("--times-key", default="block_times",
+        choices=latency_stats.TIMES_KEYS,
+        help="The durations to compare. Default: block_times")
+    parser.add_argument("--statistic", default="p50",
+        choices=latency_stats.STATISTICS,
+        help="The statistic of the durations whose ratio is the slowdown. " +
+        "Default: p50")
+    parser.add_argument("--ignore-scenario", action="store_true",
+        help="Pair benchmarks by label alone, for comparing scenarios with " +
+        "different names.")
+    parser.add_argument("--resamples", type=int, default=1000,
+        help="The number of bootstrap resamples. Default: 1000")
+    parser.add_argument("--confidence", type=float, default=0.95,
+        help="The confidence level of the slowdown intervals. Default: 0.95")
+    parser.add_argument("--alpha", type=float, default=0.05,
+        help="The significance level of the Mann-Whitney U test. " +
+        "Default: 0.05")
+    parser.add_argument("--seed", type=int, default=0,
+        help="The seed of the bootstrap resampling. Default: 0")
+    parser.add_argument("--format", choices=sorted(COMPARISON_WRITERS.keys()),
+        help="The format of the comparison. Default: the extension of " +
+        "--output, or json")
+    parser.add_argument("-o", "--output",
+        help="Write the comparison to this file instead of stdout.")
+    args = parser.parse_args()
+    other_args = argparse.Namespace(**vars(args))
+    other_args.directory = args.other_directory
+    rows = compare_results(viewer_options.load_benchmarks(args),
+        viewer_options.load_benchmarks(other_args), args)
+    write = COMPARISON_WRITERS[latency_report.get_report_format(args)]
+    if args.output is None:
+        write(rows, sys.stdout)
+    else:
+        with open(args.output, "wb") as f:
+            write(rows, f)
+    for row in rows:
+        if row["result"] != "regression":
+            continue
+        name = row["label"]
+        if row["scenario"] is not None:
+            name = "%s, %s" % (row["scenario"], row["label"])
+        sys.stderr.write("Regression: %s: %.3fx slower (%.3f to %.3f), " \
+            "p = %.3g\n" % (name, row["slowdown"], row["slowdown_low"],
+            row["slowdown_high"], row["p_value"]))
@@ -0,0 +1,88 @@
+# This file contains the code used by the matplotlib viewer scripts to reduce
+# timelines with millions of points to only a few points per horizontal pixel
+# before drawing them. The visible part of a timeline is divided into one bin
+# for every two pixels, and only the first, last, minimum and maximum points in
+# each bin are kept, so no peak is hidden. Whenever the x limits of the axes
+# or the size of the figure change (e.g. when zooming), the timeline is
+# decimated again, so zooming in shows every point.
+#
+# Usage:
+#
+#    line, = axes.plot([], [])
+#    plot = decimation.DecimatedPlot(axes, times, values, line.set_data)
+import numpy
+
+# The number of horizontal pixels covered by each bin.
+PIXELS_PER_BIN = 2
+
+def get_decimated_indices(times, values, start, end, bins):
+    """Takes a sorted array of times and either an array of values or a 2-D
+    array with one row of values per timeline, sharing the same times.
+    Returns the sorted indices of the points to keep when drawing the range
+    of times from start to end with the given number of bins. One point on
+    either side of the range is kept, so lines leading out of the range are
+    drawn."""
+    values = numpy.atleast_2d(values)
+    first = max(numpy.searchsorted(times, start, "left") - 1, 0)
+    last = min(numpy.searchsorted(times, end, "right") + 1, len(times))
+    count = last - first
+    if (count <= (4 * bins)) or (end <= start):
+        return numpy.arange(first, last)
+    # Points outside of the range fall into bins -1 and bins.
+    bin_ids = numpy.floor((times[first:last] - start) * (bins / (end -
+        start)))
+    bin_ids = numpy.clip(bin_ids, -1, bins)
+    new_bin = numpy.ones(count, dtype=bool)
+    new_bin[1:] = bin_ids[1:] != bin_ids[:-1]
+    bin_starts = numpy.flatnonzero(new_bin)
+    bin_counts = numpy.diff(numpy.append(bin_starts, count))
+    indices = numpy.arange(count)
+    keep = [bin_starts, bin_starts + bin_counts - 1]
+    for row in values:
+        row = row[first:last]
+        # Find the first index at which the minimum and maximum of each bin
+        # occur.
+        for reduce_function in (numpy.minimum, numpy.maximum):
+            extremes = reduce_function.reduceat(row, bin_starts)
+            is_extreme = row == numpy.repeat(extremes, bin_counts)
+            keep.append(numpy.minimum.reduceat(numpy.where(is_extreme,
+                indices, count), bin_starts))
+    return first + numpy.unique(numpy.concatenate(keep))
+
+class DecimatedPlot(object):
+    """Draws a decimated timeline on a set of axes, and draws it again when the
+    axes' x limits or the figure's size change. values may be a 2-D array with
+    one row per timeline. draw is called with the decimated times and values,
+    and must replace anything it drew previously."""
+    def __init__(self, axes, times, values, draw):
+        self.axes = axes
+        self.times = numpy.asarray(times)
+        self.values = numpy.asarray(values)
+        self.draw = draw
+        self.updating = False
+        # Matplotlib only keeps weak references to bound methods, so use
+        # functions to keep this object alive as long as the axes.
+        axes.callbacks.connect("xlim_changed", lambda axes: self.update())
+        axes.figure.canvas.mpl_connect("resize_event",
+            lambda event: self.update())
+        self.update()
+
+    def update(self):
+        """Decimates the timeline for the current x limits and size of the
+        axes, and draws it."""
+        # Drawing may change the x limits if they're scaled automatically.
+        if self.updating:
+            return
+        self.updating = True
+        try:
+            self.redraw()
+        finally:
+            self.updating = False
+
+    def redraw(self):
+        start, end = self.axes.get_xlim()
+        width = self.axes.get_window_extent().width
+        bins = max(int(width / PIXELS_PER_BIN), 1)
+        indices = get_decimated_indices(self.times, self.values, start, end,
+            bins)
+        self.draw(self.times[indices], self.values[..., indices])
@@ -0,0 +1,106 @@
+# This file contains the record of the plots saved by the viewer scripts with
+# --output-dir, so that plots whose inputs haven't changed aren't drawn again.
+# For each saved file, the manifest keeps a key made from the SHA-1 hashes of
+# the logs in the plotted scenario, along with the script and options used to
+# draw it. The manifest is a small JSON file in the output directory. It also
+# keeps each log's hash along with the log's size and modification time, so
+# that a log is only hashed again if either changes.
+#
+# Usage:
+#
+#    manifest = export_manifest.ExportManifest(output_directory)
+#    key = manifest.get_key(version, log_filenames)
+#    if not manifest.is_current(output_filenames, key):
+#        ...
+#        manifest.record(output_filenames, key)
+#    manifest.save()
+import hashlib
+import json
+import log_cache
+import os
+import tempfile
+
+# The name of the manifest file in each output directory.
+MANIFEST_NAME = ".manifest.json"
+
+def hash_strings(strings):
+    """Returns the SHA-1 hash of a list of strings, as a hex string."""
+    digest = hashlib.sha1()
+    for s in strings:
+        # Separate the strings so that ["ab", "c"] differs from ["a", "bc"].
+        digest.update("%d:%s;" % (len(s), s))
+    return digest.hexdigest()
+
+class ExportManifest(object):
+    """Holds the keys of the files saved in an output directory. Errors reading
+    or writing the manifest are ignored, and the files are then treated as
+    out of date."""
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.logs = manifest["logs"]
+            self.outputs = manifest["outputs"]
+        except (IOError, ValueError, KeyError, TypeError):
+            self.logs = {}
+            self.outputs = {}
+        self.changed = False
+
+    def get_log_hash(self, filename):
+        """Returns the SHA-1 hash of the log at the given path. The log is
+        only read if its size or modification time changed since it was last
+        hashed."""
+        status = os.stat(filename)
+        key = os.path.abspath(filename)
+        entry = self.logs.get(key)
+        if (entry is None) or (entry["size"] != status.st_size) or (
+            entry["mtime"] != status.st_mtime):
+            entry = {
+                "size": status.st_size,
+                "mtime": status.st_mtime,
+                "sha1": log_cache.hash_file(filename),
+            }
+            self.logs[key] = entry
+            self.changed = True
+        return entry["sha1"]
+
+    def get_key(self, version, filenames):
+        """Returns the key of a plot drawn from the logs at the given paths.
+        version must be a string identifying the script and options used."""
+        hashes = sorted(self.get_log_hash(name) for name in filenames)
+        return hash_strings([version] + hashes)
+
+    def is_current(self, filenames, key):
+        """Returns True if every one of the given output files exists and was
+        last saved with the given key."""
+        for name in filenames:
+            if self.outputs.get(os.path.basename(name)) != key:
+                return False
+            if not os.path.exists(name):
+                return False
+        return True
+
+    def record(self, filenames, key):
+        """Records that the given output files were saved with the given
+        key."""
+        for name in filenames:
+            self.outputs[os.path.basename(name)] = key
+        self.changed = True
+
+    def save(self):
+        """Writes the manifest if it has changed, under a temporary name which
+        is then renamed."""
+        if not self.changed:
+            return
+        directory = os.path.dirname(self.path)
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"logs": self.logs, "outputs": self.outputs}, f)
+            os.rename(temp_path, self.path)
+            self.changed = False
+        except (IOError, OSError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
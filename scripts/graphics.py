@@ -316,6 +316,7 @@ DEFAULT_CONFIG = {"fill":"",
           "arrow":"none",
           "text":"",
           "justify":"center",
+          "stipple":"",
                   "font": ("helvetica", 12, "normal")}
 
 class GraphicsObject:
@@ -352,6 +353,10 @@ class GraphicsObject:
         """Set line weight to width"""
         self._reconfig("width", width)
 
+    def setStipple(self, bitmap):
+        """Set the bitmap used to stipple the interior"""
+        self._reconfig("stipple", bitmap)
+
     def draw(self, canvas_frame):
 
         """Draw the object in CanvasFrame, which should be a CanvasFrame
@@ -462,7 +467,7 @@ class _BBox(GraphicsObject):
 class Rectangle(_BBox):
     
     def __init__(self, p1, p2):
-        _BBox.__init__(self, p1, p2)
+        _BBox.__init__(self, p1, p2, ["outline","width","fill","stipple"])
     
     def _draw(self, canvas_frame, options):
         p1 = self.p1
@@ -813,6 +818,69 @@ class Pixmap:
         self.image.write( filename, format=ext)
 
         
+class Batch:
+
+    """A Batch collects rectangles, lines and texts given as sequences of
+    coordinates, and draws them into a CanvasFrame all at once. Each call
+    adds a group of items sharing the same options. The items are created
+    directly on the Tk canvas, without a GraphicsObject for each one, and
+    the window is only flushed after all of them have been created."""
+
+    def __init__(self):
+        self.groups = []
+
+    def addRectangles(self, x1, y1, x2, y2, options={}):
+        """Add rectangles with opposite corners (x1[i],y1[i]) and
+        (x2[i],y2[i])"""
+        self._add("rectangle", ["outline","width","fill","stipple"],
+                  zip(x1,y1,x2,y2), None, options)
+
+    def addLines(self, x1, y1, x2, y2, options={}):
+        """Add line segments from (x1[i],y1[i]) to (x2[i],y2[i])"""
+        self._add("line", ["arrow","fill","width"], zip(x1,y1,x2,y2), None,
+                  options)
+
+    def addTexts(self, x, y, texts, options={}):
+        """Add texts[i] centered at (x[i],y[i])"""
+        self._add("text", ["justify","fill","font"], zip(x,y),
+                  list(texts), options)
+
+    def addPolygons(self, points, options={}):
+        """Add polygons, where points[i] lists the coordinates of the
+        vertices of polygon i as [x1,y1,x2,y2,...]"""
+        self._add("polygon", ["outline","width","fill"], list(points), None,
+                  options)
+
+    def _add(self, kind, names, points, texts, options):
+        config = {}
+        for name in names:
+            config[name] = DEFAULT_CONFIG[name]
+        # Lines and texts are drawn in the outline color, as in Line and Text
+        if kind in ["line", "text"]:
+            config["fill"] = DEFAULT_CONFIG["outline"]
+        config.update(options)
+        self.groups.append((kind, points, texts, config))
+
+    def draw(self, canvas_frame):
+        """Draw every item added so far in canvas_frame, and empty the
+        batch"""
+        if canvas_frame.isClosed(): raise GraphicsError, "Can't draw to closed window"
+        canvas = canvas_frame.canvas
+        for kind, points, texts, config in self.groups:
+            create = getattr(canvas, "create_" + kind)
+            for i in range(len(points)):
+                coords = points[i]
+                if canvas_frame.trans:
+                    coords = []
+                    for j in range(0, len(points[i]), 2):
+                        coords.extend(canvas_frame.toScreen(points[i][j], points[i][j+1]))
+                if texts == None:
+                    create(coords, config)
+                else:
+                    create(coords, config, text=texts[i])
+        self.groups = []
+        canvas_frame.flush()
+
 def color_rgb(r,g,b):
     """r,g,b are intensities of red, green, and blue in range(256)
     Returns color specifier string for the resulting color"""
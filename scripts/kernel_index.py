@@ -0,0 +1,106 @@
+# This file contains an index of the entries in a runner log's "times" array.
+# For each entry, the index records the offset and length of its text in the
+# file, the range of times it covers, and the iteration it belongs to. This
+# allows the kernels run during a window of time to be loaded from a large log
+# by decoding only the entries overlapping the window. Building the index
+# requires reading the whole log, but not decoding its block arrays. Indices
+# are kept in a LogCache, if one is given.
+#
+# Usage:
+#
+#    index = kernel_index.get_kernel_index(filename, cache)
+#    for i in index.find_entries(start_time, end_time):
+#        ...
+import log_parser
+import numpy
+import os
+
+# Used to keep kernel indices separately from cached logs in a LogCache.
+CACHE_KIND = "#kernel_index"
+
+# The number of characters read at a time when building an index.
+INDEX_CHUNK_SIZE = 4 * 1024 * 1024
+
+class KernelIndex(object):
+    """Holds the index of a single log. header is the dict of the log's
+    top-level fields, other than "times". The remaining arrays hold one
+    element per kernel or CPU times entry in the log, in order. entry_offset
+    and entry_length give the position of the entry's text in the file.
+    entry_start and entry_end contain the kernel_times of kernel entries and
+    the cpu_times of CPU times entries. entry_iteration is the index of the
+    CPU times entry at or preceding each entry, or -1 if there is none."""
+    __slots__ = ["header", "truncated", "entry_offset", "entry_length",
+        "entry_start", "entry_end", "entry_iteration", "is_kernel"]
+
+    def find_entries(self, start_time=None, end_time=None):
+        """Returns the indices of the entries needed to load the kernels
+        overlapping the given range of times, in file order. Either time may
+        be None to leave the range unbounded. The CPU times entry for each
+        selected kernel's iteration is included, as are any CPU times entries
+        which overlap the range."""
+        if start_time is None:
+            start_time = -numpy.inf
+        if end_time is None:
+            end_time = numpy.inf
+        overlaps = (self.entry_end >= start_time) & (self.entry_start <=
+            end_time)
+        kernels = overlaps & self.is_kernel
+        iterations = numpy.unique(self.entry_iteration[kernels])
+        selected = kernels | (~self.is_kernel & (overlaps |
+            numpy.in1d(self.entry_iteration, iterations)))
+        return numpy.flatnonzero(selected)
+
+def build_kernel_index(filename):
+    """Reads the log at the given path and returns its KernelIndex."""
+    offsets = []
+    lengths = []
+    times = []
+    iterations = []
+    is_kernel = []
+    iteration = -1
+    with open(filename, "rb") as f:
+        parser = log_parser.LogParser(f, INDEX_CHUNK_SIZE, skip_arrays=True)
+        for entry in parser:
+            if "cpu_times" in entry:
+                iteration += 1
+                times.append(entry["cpu_times"])
+                is_kernel.append(False)
+            elif "block_times" in entry:
+                times.append(entry["kernel_times"])
+                is_kernel.append(True)
+            else:
+                continue
+            offsets.append(parser.entry_start)
+            lengths.append(parser.entry_end - parser.entry_start)
+            iterations.append(iteration)
+    index = KernelIndex()
+    index.header = parser.header
+    index.truncated = parser.truncated
+    index.entry_offset = numpy.array(offsets, dtype=numpy.int64)
+    index.entry_length = numpy.array(lengths, dtype=numpy.int64)
+    times = numpy.array(times, dtype=numpy.float64).reshape((-1, 2))
+    index.entry_start = times[:, 0].copy()
+    index.entry_end = times[:, 1].copy()
+    index.entry_iteration = numpy.array(iterations, dtype=numpy.int32)
+    index.is_kernel = numpy.array(is_kernel, dtype=bool)
+    return index
+
+def get_kernel_index(filename, cache=None):
+    """Returns the KernelIndex for the log at the given path, taking it from
+    the given LogCache if possible and adding it to the cache otherwise."""
+    if cache is not None:
+        fields = cache.load(filename, CACHE_KIND)
+        if fields is not None:
+            index = KernelIndex()
+            try:
+                for k in KernelIndex.__slots__:
+                    setattr(index, k, fields[k])
+                return index
+            except KeyError:
+                pass
+        status = os.stat(filename)
+    index = build_kernel_index(filename)
+    if cache is not None:
+        cache.store(filename, status, dict((k, getattr(index, k))
+            for k in KernelIndex.__slots__), CACHE_KIND)
+    return index
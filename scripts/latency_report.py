@@ -0,0 +1,60 @@
+# This script reads all JSON result files and prints a table of the p50, p90,
+# p99, p99.9 and maximum durations, along with their mean and standard
+# deviation, for every times key. There is one row per benchmark and times key,
+# followed by one row per kernel name for kernel_times and block_times. Result
+# files with the same scenario, benchmark name and label are combined.
+#
+# Usage: python latency_report.py [options] [results directory]
+#
+# The results directory defaults to ./results. The table is written to stdout
+# as JSON unless --output or --format is given. With --sketch, the percentiles
+# are read from quantile sketches of the logs, which take a fixed amount of
+# memory however long the runs were. Run with --help to list the options.
+import latency_stats
+import sys
+import viewer_options
+
+# The formats the report may be written in, by file extension.
+REPORT_WRITERS = {
+    "json": latency_stats.write_json,
+    "csv": latency_stats.write_csv,
+}
+
+def get_report_format(args):
+    """Returns the format given with --format, or else the format given by the
+    extension of --output, or else json."""
+    if args.format is not None:
+        return args.format
+    if args.output is not None:
+        extension = args.output.rsplit(".", 1)[-1].lower()
+        if extension in REPORT_WRITERS:
+            return extension
+    return "json"
+
+if __name__ == "__main__":
+    parser = viewer_options.get_argument_parser("Prints percentiles of the "
+        "durations of each benchmark and kernel.")
+    parser.add_argument("--times-key", action="append",
+        choices=latency_stats.TIMES_KEYS,
+        help="Only report the given times key. May be given more than once. " +
+        "Default: every key")
+    parser.add_argument("--format", choices=sorted(REPORT_WRITERS.keys()),
+        help="The format of the report. Default: the extension of --output, " +
+        "or json")
+    parser.add_argument("-o", "--output",
+        help="Write the report to this file instead of stdout.")
+    viewer_options.add_sketch_argument(parser)
+    args = parser.parse_args()
+    times_keys = latency_stats.TIMES_KEYS
+    if args.times_key:
+        times_keys = [k for k in times_keys if k in args.times_key]
+    get_rows = latency_stats.get_report_rows
+    if args.sketch:
+        get_rows = latency_stats.get_sketch_report_rows
+    rows = get_rows(viewer_options.load_benchmarks(args), times_keys)
+    write = REPORT_WRITERS[get_report_format(args)]
+    if args.output is None:
+        write(rows, sys.stdout)
+    else:
+        with open(args.output, "wb") as f:
+            write(rows, f)
@@ -0,0 +1,279 @@
+# This file contains the code for summarizing the durations recorded in
+# BenchmarkLogs: percentiles, the mean and the standard deviation of every
+# times key, for each benchmark and for each of its kernels. The statistics of
+# all the groups of durations are computed together with a few numpy
+# operations, rather than in a Python loop over groups or values.
+#
+# Usage, from another script in this directory:
+#
+#    import latency_stats
+#    rows = latency_stats.get_report_rows(benchmarks)
+#    latency_stats.write_csv(rows, sys.stdout)
+#
+# The same report can be made from the LogSketches of the logs, with each
+# percentile then within the sketches' relative accuracy of its true value.
+import benchmark_log
+import collections
+import csv
+import json
+import math
+import numpy
+import quantile_sketch
+
+# Every times key which can be summarized, in the order they're reported.
+TIMES_KEYS = ["kernel_times", "block_times"] + benchmark_log.CPU_TIMES_KEYS
+
+# The percentiles included in the report.
+PERCENTILES = [50.0, 90.0, 99.0, 99.9]
+
+# The statistics which may be compared between two sets of durations: the mean,
+# or a percentile, given as "p" followed by the percentile. The median is
+# "p50".
+STATISTICS = ["mean"] + ["p%g" % p for p in PERCENTILES]
+
+# The largest number of values resampled at once when bootstrapping. Larger
+# samples are resampled a few times at a time, to limit memory use.
+BOOTSTRAP_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The columns of the report, in order. The percentile columns are named "p"
+# followed by the percentile, e.g. "p99.9". The relative error is the largest
+# relative error of the percentiles, which is 0 unless they were read from
+# sketches.
+REPORT_COLUMNS = ["scenario", "benchmark", "label", "times_key",
+    "kernel_name", "count", "mean", "stddev"] + \
+    ["p%g" % p for p in PERCENTILES] + ["max", "relative_error"]
+
+def get_group_stats(values, groups, group_count, percentiles=PERCENTILES):
+    """Takes an array of values and an array of the same length holding the
+    index of the group each value belongs to, from 0 to group_count - 1.
+    Returns a dict holding arrays with one entry per group: "count", "mean",
+    "stddev" (the population standard deviation), "max", and "percentiles",
+    with one row per group and one column per percentile. Percentiles are
+    interpolated linearly between the closest values, as numpy.percentile
+    does. Every statistic but the count is NaN for empty groups."""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    groups = numpy.asarray(groups, dtype=numpy.int64)
+    counts = numpy.bincount(groups, minlength=group_count)
+    present = counts > 0
+    safe_counts = numpy.maximum(counts, 1)
+    sums = numpy.bincount(groups, weights=values, minlength=group_count)
+    means = numpy.where(present, sums / safe_counts, numpy.nan)
+    # The variance is taken around the mean rather than from the sum of
+    # squares, which loses precision when the values are far from 0.
+    deviations = values - means[groups]
+    variances = numpy.bincount(groups, weights=deviations * deviations,
+        minlength=group_count) / safe_counts
+    stddevs = numpy.where(present, numpy.sqrt(variances), numpy.nan)
+
+    # Sort by group, then by value, so each group's values are contiguous.
+    sorted_values = values[numpy.lexsort((values, groups))]
+    starts = numpy.cumsum(counts) - counts
+    lasts = numpy.maximum(starts + counts - 1, 0)
+    result = numpy.full((group_count, len(percentiles)), numpy.nan)
+    maxes = numpy.full(group_count, numpy.nan)
+    if len(sorted_values) != 0:
+        positions = starts[:, None] + (numpy.asarray(percentiles)[None, :] /
+            100.0) * (safe_counts - 1)[:, None]
+        lower = numpy.floor(positions).astype(numpy.int64)
+        upper = numpy.minimum(lower + 1, lasts[:, None])
+        fractions = positions - lower
+        lower = numpy.minimum(lower, len(sorted_values) - 1)
+        upper = numpy.minimum(upper, len(sorted_values) - 1)
+        interpolated = sorted_values[lower] * (1.0 - fractions) + \
+            sorted_values[upper] * fractions
+        result[present] = interpolated[present]
+        maxes[present] = sorted_values[lasts[present]]
+    return {"count": counts, "mean": means, "stddev": stddevs,
+        "max": maxes, "percentiles": result}
+
+def get_statistic(values, statistic):
+    """Returns the given statistic (one of STATISTICS) of each row of a 2-D
+    array of values."""
+    if statistic == "mean":
+        return values.mean(axis=1)
+    return numpy.percentile(values, float(statistic[1:]), axis=1)
+
+def get_bootstrap_statistics(values, statistic, resamples, random):
+    """Returns an array holding the given statistic of each of the given number
+    of resamples of the values, drawn with replacement using the given
+    numpy.random.RandomState. Many resamples are drawn and summarized at
+    once, as rows of a 2-D array."""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    chunk = max(1, BOOTSTRAP_CHUNK_SIZE // len(values))
+    results = []
+    for start in range(0, resamples, chunk):
+        count = min(chunk, resamples - start)
+        indices = random.randint(0, len(values), (count, len(values)))
+        results.append(get_statistic(values[indices], statistic))
+    return numpy.concatenate([numpy.zeros(0)] + results)
+
+def get_bootstrap_ratios(baseline, values, statistic, resamples, seed):
+    """Returns an array of the given number of bootstrap replicates of the
+    ratio of the given statistic of values to the statistic of baseline. The
+    resamples are drawn from a RandomState with the given seed."""
+    random = numpy.random.RandomState(seed)
+    baseline_statistics = get_bootstrap_statistics(baseline, statistic,
+        resamples, random)
+    return get_bootstrap_statistics(values, statistic, resamples, random) / \
+        baseline_statistics
+
+def mann_whitney_u(baseline, values):
+    """Performs a two-sided Mann-Whitney U test of whether values taken from
+    either array are equally likely to be the larger. Returns (u, p), where u
+    is the number of pairs of a baseline value and a value in which the value
+    is larger, counting ties as half, and p is the p-value. The p-value uses
+    the normal approximation, corrected for ties and for continuity, which is
+    accurate unless both arrays hold only a few values."""
+    baseline_count = len(baseline)
+    count = len(values)
+    total = baseline_count + count
+    combined = numpy.concatenate((baseline, values))
+    order = numpy.argsort(combined, kind="mergesort")
+    combined = combined[order]
+    # Tied values all get the average of their ranks, starting from 1.
+    starts = numpy.flatnonzero(numpy.concatenate(([True],
+        combined[1:] != combined[:-1])))
+    ends = numpy.append(starts[1:], total)
+    ranks = numpy.empty(total)
+    ranks[order] = numpy.repeat((starts + ends + 1) / 2.0, ends - starts)
+    u = ranks[baseline_count:].sum() - count * (count + 1) / 2.0
+    ties = (ends - starts).astype(numpy.float64)
+    variance = baseline_count * count / 12.0 * ((total + 1) -
+        (ties ** 3 - ties).sum() / (total * (total - 1.0)))
+    if variance <= 0:
+        return u, 1.0
+    z = max(abs(u - baseline_count * count / 2.0) - 0.5, 0.0) / \
+        math.sqrt(variance)
+    return u, math.erfc(z / math.sqrt(2.0))
+
+def benchmark_group_key(benchmark):
+    """Returns the (scenario, benchmark, label) tuple identifying the rows a
+    BenchmarkLog contributes to. Logs with the same key are reported
+    together."""
+    return (benchmark.scenario_name, benchmark.benchmark_name,
+        benchmark.label)
+
+def report_sort_key(row):
+    """Returns the key ordering the report's rows. None sorts before any
+    name, so each benchmark's overall row comes before its kernels."""
+    return (row["scenario"], row["benchmark"], row["label"],
+        TIMES_KEYS.index(row["times_key"]), row["kernel_name"] is not None,
+        row["kernel_name"])
+
+def get_report_rows(benchmarks, times_keys=TIMES_KEYS):
+    """Takes a list of BenchmarkLogs and returns a list of report rows, each
+    a dict mapping the names in REPORT_COLUMNS to values. For every times key,
+    there is one row for all of each benchmark's durations, with a
+    kernel_name of None, and for kernel_times and block_times, one row per
+    kernel name too. Kernels without a name only count towards the first
+    row. BenchmarkLogs with the same scenario, benchmark name and
+    label are combined. Durations are in seconds."""
+    keys = sorted(set(benchmark_group_key(b) for b in benchmarks))
+    key_indices = dict((k, i) for i, k in enumerate(keys))
+    rows = []
+    for times_key in times_keys:
+        durations = []
+        groups = []
+        kernel_groups = []
+        kernel_group_lookup = {}
+        for b in benchmarks:
+            values = b.get_durations(times_key)
+            key_index = key_indices[benchmark_group_key(b)]
+            durations.append(values)
+            groups.append(numpy.full(len(values), key_index,
+                dtype=numpy.int64))
+            name_ids = b.get_kernel_name_ids(times_key)
+            if name_ids is None:
+                continue
+            # Kernels with the same name in logs reported together share a
+            # row, so map each log's name indices to the rows' indices. The
+            # row of unnamed kernels would look just like the benchmark's
+            # row, so they're given an index of -1 and left out.
+            row_ids = []
+            for name in b.kernel_names:
+                if name is None:
+                    row_ids.append(-1)
+                    continue
+                group = (key_index, name)
+                if not group in kernel_group_lookup:
+                    kernel_group_lookup[group] = len(kernel_groups)
+                    kernel_groups.append(group)
+                row_ids.append(kernel_group_lookup[group])
+            row_ids = numpy.array(row_ids, dtype=numpy.int64)[name_ids]
+            named = row_ids >= 0
+            groups.append(len(keys) + row_ids[named])
+            durations.append(values[named])
+        if len(durations) == 0:
+            continue
+        stats = get_group_stats(numpy.concatenate(durations),
+            numpy.concatenate(groups), len(keys) + len(kernel_groups))
+        row_groups = [(i, None) for i in range(len(keys))] + kernel_groups
+        for i, (key_index, kernel_name) in enumerate(row_groups):
+            if stats["count"][i] == 0:
+                continue
+            scenario, benchmark, label = keys[key_index]
+            row = collections.OrderedDict()
+            row["scenario"] = scenario
+            row["benchmark"] = benchmark
+            row["label"] = label
+            row["times_key"] = times_key
+            row["kernel_name"] = kernel_name
+            row["count"] = int(stats["count"][i])
+            row["mean"] = float(stats["mean"][i])
+            row["stddev"] = float(stats["stddev"][i])
+            for j in range(len(PERCENTILES)):
+                row["p%g" % PERCENTILES[j]] = float(stats["percentiles"][i, j])
+            row["max"] = float(stats["max"][i])
+            row["relative_error"] = 0.0
+            rows.append(row)
+    rows.sort(key=report_sort_key)
+    return rows
+
+def get_sketch_report_rows(logs, times_keys=TIMES_KEYS):
+    """Like get_report_rows, but takes a list of LogSketches. The sketches of
+    logs with the same scenario, benchmark name and label are merged. The
+    count, mean, standard deviation and maximum are exact."""
+    merged = {}
+    for log in logs:
+        for times_key in times_keys:
+            for kernel_name in [None] + log.get_kernel_names(times_key):
+                if not (times_key, kernel_name) in log.sketches:
+                    continue
+                key = benchmark_group_key(log) + (times_key, kernel_name)
+                if not key in merged:
+                    merged[key] = quantile_sketch.QuantileSketch(
+                        log.relative_accuracy)
+                merged[key].merge(log.get_sketch(times_key, kernel_name))
+    rows = []
+    for key in merged:
+        sketch = merged[key]
+        if sketch.get_count() == 0:
+            continue
+        row = collections.OrderedDict(zip(["scenario", "benchmark", "label",
+            "times_key", "kernel_name"], key))
+        row["count"] = sketch.count
+        row["mean"] = sketch.mean
+        row["stddev"] = sketch.get_stddev()
+        percentiles = sketch.get_quantiles(numpy.array(PERCENTILES) / 100.0)
+        for j in range(len(PERCENTILES)):
+            row["p%g" % PERCENTILES[j]] = float(percentiles[j])
+        row["max"] = sketch.max
+        row["relative_error"] = sketch.relative_accuracy
+        rows.append(row)
+    rows.sort(key=report_sort_key)
+    return rows
+
+def write_json(rows, f):
+    """Writes the report rows to the given file as a JSON array of objects.
+    Missing names and labels are written as null."""
+    json.dump(rows, f, indent=2, separators=(",", ": "))
+    f.write("\n")
+
+def write_csv(rows, f, columns=REPORT_COLUMNS):
+    """Writes the report rows to the given file as CSV, with a header line
+    naming the given columns. Missing names and labels are written as empty
+    fields."""
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row[k] is None else row[k] for k in columns])
@@ -0,0 +1,179 @@
+# This file contains a persistent cache for the arrays loaded from runner logs,
+# so that the viewer scripts don't need to decode the same JSON logs every time
+# they're run. Each log's arrays are saved in an uncompressed .npz file in the
+# cache directory, along with the log's size, modification time and SHA-1
+# hash. A cached copy is used only if the log's size matches and either its
+# modification time or its hash also match.
+#
+# The cache directory defaults to ~/.cache/cuda_scheduling_examiner, and can be
+# changed by setting the CUDA_SCHEDULING_EXAMINER_CACHE environment variable.
+# When the cache grows beyond its size limit, the least recently used entries
+# are deleted. Small logs aren't cached, since decoding them is faster than
+# reading a cache file.
+#
+# Usage:
+#
+#    cache = log_cache.LogCache()
+#    benchmarks = benchmark_log.load_benchmark_logs(filenames, cache)
+import hashlib
+import json
+import numpy
+import os
+import tempfile
+import zipfile
+
+# Increase this whenever the contents of a cached log change, so that older
+# cache entries are ignored.
+CACHE_VERSION = 1
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache",
+    "cuda_scheduling_examiner")
+
+# The default limit on the total size of the cache, in bytes.
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Logs smaller than this many bytes aren't cached.
+DEFAULT_MIN_SIZE = 256 * 1024
+
+# The number of bytes read at a time when hashing a log.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(filename):
+    """Returns the SHA-1 hash of the file's contents, as a hex string."""
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        while True:
+            data = f.read(HASH_CHUNK_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+def get_default_directory():
+    """Returns the cache directory to use if none is given."""
+    return os.environ.get("CUDA_SCHEDULING_EXAMINER_CACHE", DEFAULT_DIRECTORY)
+
+class LogCache(object):
+    """Stores the fields of loaded logs in a cache directory. Fields holding
+    numpy arrays are saved as arrays, and all other fields must be JSON
+    values. Errors reading or writing the cache are ignored, and treated as
+    cache misses."""
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE,
+        min_size=DEFAULT_MIN_SIZE):
+        if directory is None:
+            directory = get_default_directory()
+        self.directory = directory
+        self.max_size = max_size
+        self.min_size = min_size
+
+    def get_cache_path(self, filename, kind=""):
+        """Returns the path of the cache file for the given log. Different
+        kinds of data derived from the same log are kept in separate files."""
+        key = hashlib.sha1(os.path.abspath(filename) + kind).hexdigest()
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, filename, kind=""):
+        """Returns a dict containing the fields of the given kind stored for
+        the log at the given path, or None if the cache doesn't hold an
+        up-to-date copy."""
+        path = self.get_cache_path(filename, kind)
+        try:
+            status = os.stat(filename)
+            if status.st_size < self.min_size:
+                return None
+            with open(path, "rb") as f:
+                data = numpy.load(f)
+                metadata = json.loads(str(data["metadata"]))
+                arrays = dict((k, data[k]) for k in data.files
+                    if k != "metadata")
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            return None
+        if metadata.get("version") != CACHE_VERSION:
+            return None
+        if metadata["size"] != status.st_size:
+            return None
+        if metadata["mtime"] != status.st_mtime:
+            # The log may have been copied or touched without being changed.
+            if metadata["sha1"] != hash_file(filename):
+                return None
+            metadata["mtime"] = status.st_mtime
+            self.write(path, metadata, arrays)
+        else:
+            # The cache file's modification time records when it was last
+            # used, for eviction.
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        fields = metadata["fields"]
+        fields.update(arrays)
+        return fields
+
+    def store(self, filename, status, fields, kind=""):
+        """Saves the dict of fields of the given kind loaded from the log at
+        the given path. status must be the result of os.stat for the log from
+        before it was read. Nothing is stored if the log has been modified
+        since then."""
+        if status.st_size < self.min_size:
+            return
+        digest = hash_file(filename)
+        current = os.stat(filename)
+        if (current.st_size != status.st_size) or (current.st_mtime !=
+            status.st_mtime):
+            return
+        metadata = {
+            "version": CACHE_VERSION,
+            "size": status.st_size,
+            "mtime": status.st_mtime,
+            "sha1": digest,
+            "fields": {},
+        }
+        arrays = {}
+        for k in fields:
+            if isinstance(fields[k], numpy.ndarray):
+                arrays[k] = fields[k]
+            else:
+                metadata["fields"][k] = fields[k]
+        self.write(self.get_cache_path(filename, kind), metadata, arrays)
+        self.evict()
+
+    def write(self, path, metadata, arrays):
+        """Writes a cache file. The file is written under a temporary name and
+        then renamed, so a partially written file is never read."""
+        temp_path = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp",
+                dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                numpy.savez(f, metadata=numpy.array(json.dumps(metadata)),
+                    **arrays)
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def evict(self):
+        """Deletes the least recently used cache files until the cache's total
+        size is within its limit."""
+        entries = []
+        try:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".npz"):
+                    continue
+                path = os.path.join(self.directory, name)
+                status = os.stat(path)
+                entries.append((status.st_mtime, status.st_size, path))
+        except OSError:
+            return
+        total_size = sum(e[1] for e in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
@@ -0,0 +1,125 @@
+# This file contains an index of the header fields of runner logs, so that
+# logs can be grouped or filtered by scenario or label without decoding their
+# "times" arrays. Reading a header only requires reading the start of a log.
+# The headers for each results directory are saved in a small JSON file in the
+# cache directory used by log_cache, along with each log's size and
+# modification time. A log's header is only read again if either changes.
+#
+# Usage:
+#
+#    index = log_index.LogIndex()
+#    headers = index.get_headers(filenames)
+#    filenames = log_index.filter_logs(filenames, headers, ["Scenario 1"])
+import hashlib
+import json
+import log_cache
+import log_parser
+import os
+import tempfile
+
+# The header fields kept in the index.
+HEADER_KEYS = ["scenario_name", "benchmark_name", "label", "PID", "TID",
+    "release_time", "max_resident_threads"]
+
+# The number of characters read at a time when reading a header.
+HEADER_CHUNK_SIZE = 4096
+
+def read_header(filename):
+    """Reads the fields preceding the "times" array in the log at the given
+    path, and returns a dict containing the fields in HEADER_KEYS. Missing
+    fields are None."""
+    with open(filename) as f:
+        parser = log_parser.LogParser(f, HEADER_CHUNK_SIZE)
+    return dict((k, parser.header.get(k)) for k in HEADER_KEYS)
+
+def read_headers(filenames):
+    """Returns a list containing the header of each log, without using an
+    index."""
+    return [read_header(name) for name in filenames]
+
+def filter_logs(filenames, headers, scenarios=None, labels=None):
+    """Takes a list of log filenames and a list of their headers, and returns
+    the filenames of the logs with one of the given scenario names and one of
+    the given labels. Either list may be None to allow any value."""
+    selected = []
+    for name, header in zip(filenames, headers):
+        if scenarios and not (header["scenario_name"] in scenarios):
+            continue
+        if labels and not (header["label"] in labels):
+            continue
+        selected.append(name)
+    return selected
+
+class LogIndex(object):
+    """Keeps an index file of log headers for each results directory in the
+    given cache directory. Errors reading or writing index files are
+    ignored."""
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = log_cache.get_default_directory()
+        self.directory = directory
+
+    def get_index_path(self, results_directory):
+        """Returns the path of the index file for a results directory."""
+        key = hashlib.sha1(os.path.abspath(results_directory)).hexdigest()
+        return os.path.join(self.directory, "index-" + key + ".json")
+
+    def get_headers(self, filenames):
+        """Returns a list containing the header of each log, as returned by
+        read_header. Headers are only read from logs which aren't in the index
+        or have changed, and the index is then updated."""
+        headers = {}
+        directories = {}
+        for name in filenames:
+            directory = os.path.dirname(os.path.abspath(name))
+            if not directory in directories:
+                directories[directory] = []
+            directories[directory].append(name)
+        for directory in directories:
+            headers.update(self.get_directory_headers(directory,
+                directories[directory]))
+        return [headers[name] for name in filenames]
+
+    def get_directory_headers(self, directory, filenames):
+        """Returns a dict mapping each of the given filenames, which must all
+        be in the given directory, to its header."""
+        path = self.get_index_path(directory)
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            index = {}
+        changed = False
+        headers = {}
+        for name in filenames:
+            status = os.stat(name)
+            key = os.path.basename(name)
+            entry = index.get(key)
+            if (entry is None) or (entry["size"] != status.st_size) or (
+                entry["mtime"] != status.st_mtime):
+                entry = {
+                    "size": status.st_size,
+                    "mtime": status.st_mtime,
+                    "header": read_header(name),
+                }
+                index[key] = entry
+                changed = True
+            headers[name] = entry["header"]
+        if changed:
+            self.write(path, index)
+        return headers
+
+    def write(self, path, index):
+        """Writes an index file under a temporary name, and then renames it."""
+        temp_path = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp",
+                dir=self.directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f)
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
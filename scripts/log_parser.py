@@ -0,0 +1,314 @@
+# This file contains an incremental parser for the JSON logs written by the
+# runner. The runner writes a log's header first, then appends one entry to
+# its "times" array for each iteration and each kernel, flushing as it goes.
+# A log from a benchmark that didn't finish therefore ends part way through an
+# entry, and isn't valid JSON.
+#
+# Rather than reading the whole file and decoding it at once, the LogParser
+# reads the log in chunks, decoding the header and then one "times" entry at a
+# time. Only the entry being decoded and the unparsed part of the current
+# chunk are held in memory. If the log ends before its final entry is
+# complete, that entry is dropped.
+#
+# Almost all of a log's text is the block_times and block_smids arrays in its
+# kernel entries. Decoding these with the json module creates a Python object
+# for every number, so the parser instead locates the arrays in each entry and
+# converts them straight into numpy arrays. Only the rest of the entry is
+# decoded as JSON, using orjson if it's installed.
+#
+# Usage:
+#
+#    with open(filename) as f:
+#        parser = LogParser(f)
+#        print parser.header["scenario_name"]
+#        for entry in parser:
+#            ...
+import json
+import numpy
+import re
+import sys
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# The number of characters read from the file at a time.
+CHUNK_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Characters which may appear in a JSON number.
+NUMBER_CHARACTERS = "0123456789.eE+-"
+
+# Matches a JSON string, or any bracket outside of a string. Numbers aren't
+# matched, so scanning a numeric array only stops at its closing bracket.
+STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+
+# The numeric arrays in kernel entries which are decoded into numpy arrays,
+# mapped to the type of their elements.
+NUMERIC_ARRAYS = {
+    '"block_times"': numpy.float64,
+    '"block_smids"': numpy.uint32,
+}
+
+def parse_numeric_array(text, dtype):
+    """Takes the text between the brackets of a JSON array of numbers and
+    returns a numpy array of the given type. Raises a ValueError if the text
+    isn't a list of numbers separated by commas."""
+    values = numpy.fromstring(text, dtype=dtype, sep=",")
+    if len(values) != (text.count(",") + 1):
+        if (len(values) == 0) and (text.strip() == ""):
+            return values
+        raise ValueError("Invalid numeric array.")
+    return values
+
+def find_object(text, position):
+    """Finds the end of the JSON object starting at the given position in the
+    text, and any numeric arrays directly within it. Returns None if the
+    object doesn't end within the text. Otherwise, returns the position
+    following the object and a list of (key, start, end) tuples, giving the
+    position of the text between each numeric array's brackets."""
+    depth = 0
+    key = None
+    arrays = []
+    while True:
+        match = STRUCTURE.search(text, position)
+        if match is None:
+            return None
+        token = match.group()
+        position = match.end()
+        if token[0] == '"':
+            key = token
+            continue
+        if (token == "[") and (depth == 1) and (key in NUMERIC_ARRAYS):
+            # Skip straight to the end of a numeric array rather than
+            # searching through its numbers for brackets.
+            end = text.find("]", position)
+            if end < 0:
+                return None
+            if ((text.find('"', position, end) < 0) and
+                (text.find("[", position, end) < 0)):
+                arrays.append((key, position, end))
+                position = end + 1
+                key = None
+                continue
+        if (token == "{") or (token == "["):
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return position, arrays
+        key = None
+
+def decode_object(text, start, end, arrays, skip_arrays=False):
+    """Decodes the object between the given positions in the text, where
+    arrays is the list of numeric arrays returned by find_object. The numeric
+    arrays are converted into numpy arrays, or set to None if skip_arrays is
+    True. Raises a ValueError if the object is malformed."""
+    pieces = []
+    values = {}
+    previous = start
+    for key, array_start, array_end in arrays:
+        if skip_arrays:
+            values[key[1:-1]] = None
+        else:
+            values[key[1:-1]] = parse_numeric_array(
+                text[array_start:array_end], NUMERIC_ARRAYS[key])
+        pieces.append(text[previous:array_start])
+        previous = array_end
+    pieces.append(text[previous:end])
+    entry = loads("".join(pieces))
+    entry.update(values)
+    return entry
+
+def decode_entry(text):
+    """Decodes a single entry from a log's "times" array, converting its
+    numeric arrays into numpy arrays."""
+    start = WHITESPACE.match(text).end()
+    found = None
+    if text.startswith("{", start):
+        found = find_object(text, start)
+    if found is not None:
+        try:
+            return decode_object(text, start, found[0], found[1])
+        except ValueError:
+            pass
+    return json.loads(text)
+
+class LogParser(object):
+    """Parses a runner log from an open file. The top-level fields preceding
+    the "times" array are decoded when the parser is created, and stored in
+    the header dict. Iterating over the parser yields each entry in the
+    "times" array as a dict. If the log ends before the "times" array is
+    closed, iteration stops after the last complete entry and truncated is
+    set to True. A log which is empty or ends in its header, such as one the
+    runner has only just opened, has no entries, and a warning is written to
+    stderr. Any top-level fields following the "times" array are added to
+    header once iteration is complete. If skip_arrays is True, the numeric
+    arrays in each entry are set to None rather than being decoded. While
+    iterating, entry_start and entry_end hold the offsets in the file of the
+    text of the last entry returned."""
+    def __init__(self, f, chunk_size=CHUNK_SIZE, skip_arrays=False):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.skip_arrays = skip_arrays
+        # The offset in the file of the start of the buffer.
+        self.buffer_offset = 0
+        self.entry_start = None
+        self.entry_end = None
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.truncated = False
+        self.in_times = False
+        self.header = {}
+        c = self.peek()
+        if c is None:
+            # The runner has created the log, but not yet written to it.
+            self.truncated = True
+        elif c != "{":
+            raise ValueError("A log must contain a JSON object.")
+        else:
+            self.position += 1
+            self.read_fields()
+        if not self.in_times and self.truncated:
+            sys.stderr.write("Warning: %s ended in its header, so it has no "
+                "entries.\n" % getattr(f, "name", "A log"))
+
+    def read_more(self):
+        """Appends more of the file to the buffer, discarding the text that
+        has already been parsed. Returns False if the end of the file was
+        reached."""
+        if self.eof:
+            return False
+        remaining = self.buffer[self.position:]
+        self.buffer_offset += self.position
+        self.position = 0
+        # Reading at least as much as is already buffered means a single very
+        # large value only needs to be re-decoded a logarithmic number of
+        # times.
+        data = self.f.read(max(self.chunk_size, len(remaining)))
+        if not data:
+            self.eof = True
+            self.buffer = remaining
+            return False
+        self.buffer = remaining + data
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming
+        it. Returns None at the end of the file."""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return None
+
+    def decode_value(self):
+        """Decodes and returns the JSON value at the current position, reading
+        more of the file as needed. Raises a ValueError if the value is
+        malformed or incomplete at the end of the file."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer,
+                    self.position)
+            except ValueError:
+                if not self.read_more():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk,
+            # and its prefix (e.g. "1." or "2e") may have been decoded alone.
+            at_end = end == len(self.buffer)
+            if at_end or (self.buffer[end] in NUMBER_CHARACTERS):
+                if self.read_more():
+                    continue
+            self.position = end
+            return value
+
+    def decode_entry(self):
+        """Decodes and returns the entry at the current position, like
+        decode_value, except that numeric arrays in an object are converted
+        into numpy arrays without decoding them as JSON."""
+        if self.peek() != "{":
+            return self.decode_value()
+        found = find_object(self.buffer, self.position)
+        while found is None:
+            if not self.read_more():
+                raise ValueError("The log ended part way through an entry.")
+            found = find_object(self.buffer, self.position)
+        end, arrays = found
+        try:
+            entry = decode_object(self.buffer, self.position, end, arrays,
+                self.skip_arrays)
+        except ValueError:
+            # Leave anything unusual, such as a string containing an
+            # unmatched bracket, to the JSON decoder.
+            return self.decode_value()
+        self.position = end
+        return entry
+
+    def read_fields(self):
+        """Reads "key": value pairs into the header until either the end of
+        the top-level object or the start of the "times" array."""
+        while True:
+            c = self.peek()
+            if c == ",":
+                self.position += 1
+                continue
+            if c == "}":
+                self.position += 1
+                return
+            if c is None:
+                self.truncated = True
+                return
+            try:
+                key = self.decode_value()
+                if self.peek() != ":":
+                    raise ValueError("Expected ':' after \"%s\"." % key)
+                self.position += 1
+                if key == "times":
+                    if self.peek() != "[":
+                        raise ValueError("The \"times\" field isn't a list.")
+                    self.position += 1
+                    self.in_times = True
+                    return
+                self.header[key] = self.decode_value()
+            except ValueError:
+                if not self.eof:
+                    raise
+                self.truncated = True
+                return
+
+    def __iter__(self):
+        while self.in_times:
+            c = self.peek()
+            if c == ",":
+                self.position += 1
+                continue
+            if c == "]":
+                self.position += 1
+                self.in_times = False
+                self.read_fields()
+                return
+            if c is None:
+                self.in_times = False
+                self.truncated = True
+                return
+            start = self.buffer_offset + self.position
+            try:
+                entry = self.decode_entry()
+            except ValueError:
+                if not self.eof:
+                    raise
+                # The final entry was only partially written.
+                self.in_times = False
+                self.truncated = True
+                return
+            self.entry_start = start
+            self.entry_end = self.buffer_offset + self.position
+            yield entry
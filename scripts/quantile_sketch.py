@@ -0,0 +1,412 @@
+# This file contains mergeable quantile sketches of the durations recorded in
+# runner logs. For very long runs, keeping every duration just to draw a CDF
+# or read off percentiles takes memory in proportion to the length of the run.
+# A sketch instead counts the durations in buckets whose bounds grow
+# geometrically, so that any quantile read from it is within a fixed relative
+# error of the true value, while its size only depends on the range of the
+# durations. Sketches of the same accuracy are merged by adding their counts,
+# so the sketches of several logs or runs can be combined exactly.
+#
+# A log's sketches are built while it's parsed, one entry at a time, without
+# keeping its arrays, and are kept in the LogCache alongside the cached logs.
+#
+# Usage, from another script in this directory:
+#
+#    import quantile_sketch
+#    logs = quantile_sketch.load_all_sketches(filenames)
+#    sketch = logs[0].get_sketch("block_times")
+#    print sketch.get_quantiles([0.5, 0.99])
+import benchmark_log
+import log_parser
+import math
+import multiprocessing
+import numpy
+import os
+
+# The largest relative error of any quantile read from a sketch, unless another
+# accuracy is given.
+RELATIVE_ACCURACY = 0.01
+
+# Durations of at most this many seconds are counted together, as 0.
+MIN_DURATION = 1.0e-9
+
+# Durations added one at a time are buffered, and counted this many at once.
+BUFFER_SIZE = 65536
+
+# The kind of cache entry holding a log's sketches, and its version. Increase
+# the version whenever the contents of the sketches change.
+CACHE_KIND = "sketches"
+SKETCH_VERSION = 2
+
+class QuantileSketch(object):
+    """Counts values in buckets covering (gamma^(i - 1), gamma^i] for each
+    integer i, where gamma = (1 + a) / (1 - a) for relative accuracy a. Every
+    value in a bucket is within a relative error of a from the bucket's
+    midpoint, 2 * gamma^i / (gamma + 1), which is used as the bucket's value.
+    Values of at most MIN_DURATION are counted as 0. The count, mean,
+    variance, minimum and maximum of the values are kept exactly."""
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # counts[j] is the count of bucket offset + j.
+        self.offset = 0
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.mean = 0.0
+        # The sum of the squared differences from the mean.
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.pending_values = []
+        self.pending_arrays = []
+        self.pending_count = 0
+
+    def __getstate__(self):
+        self.flush()
+        state = dict(self.__dict__)
+        del state["pending_values"], state["pending_arrays"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pending_values = []
+        self.pending_arrays = []
+        self.pending_count = 0
+
+    def append(self, value):
+        """Adds a single value. Values are counted in batches, once enough
+        have been added or the sketch is read."""
+        self.pending_values.append(value)
+        self.pending_count += 1
+        if self.pending_count >= BUFFER_SIZE:
+            self.flush()
+
+    def extend(self, values):
+        """Adds an array of values, which may be counted later, like
+        append."""
+        self.pending_arrays.append(numpy.asarray(values, dtype=numpy.float64))
+        self.pending_count += len(values)
+        if self.pending_count >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Counts every value added since the last flush."""
+        if self.pending_count == 0:
+            return
+        values = numpy.concatenate(self.pending_arrays +
+            [numpy.array(self.pending_values, dtype=numpy.float64)])
+        self.pending_values = []
+        self.pending_arrays = []
+        self.pending_count = 0
+        self.add(values)
+
+    def add(self, values):
+        """Counts an array of values immediately."""
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        deviations = values - mean
+        self.add_moments(len(values), mean, numpy.dot(deviations, deviations))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > MIN_DURATION]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        buckets = numpy.ceil(numpy.log(positive) / self.log_gamma).astype(
+            numpy.int64)
+        first = buckets.min()
+        self.add_counts(first, numpy.bincount(buckets - first))
+
+    def add_moments(self, count, mean, m2):
+        """Combines the given count, mean and sum of squared differences from
+        the mean with the sketch's own."""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / float(total)
+        self.m2 += m2 + delta * delta * self.count * count / float(total)
+        self.count = total
+
+    def add_counts(self, offset, counts):
+        """Adds the counts of the buckets from offset onwards."""
+        if len(self.counts) == 0:
+            self.offset = offset
+            self.counts = counts.astype(numpy.int64)
+            return
+        first = min(self.offset, offset)
+        last = max(self.offset + len(self.counts), offset + len(counts))
+        merged = numpy.zeros(last - first, dtype=numpy.int64)
+        merged[self.offset - first:self.offset - first + len(self.counts)] += \
+            self.counts
+        merged[offset - first:offset - first + len(counts)] += counts
+        self.offset = first
+        self.counts = merged
+
+    def merge(self, other):
+        """Adds every value counted by another sketch of the same accuracy.
+        Raises a ValueError if the accuracies differ."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches of the same accuracy can be " +
+                "merged.")
+        self.flush()
+        other.flush()
+        if other.count == 0:
+            return
+        self.add_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        if len(other.counts) != 0:
+            self.add_counts(other.offset, other.counts)
+
+    def get_count(self):
+        self.flush()
+        return self.count
+
+    def get_stddev(self):
+        """Returns the population standard deviation of the values."""
+        self.flush()
+        if self.count == 0:
+            return float("nan")
+        return math.sqrt(self.m2 / self.count)
+
+    def get_bucket_values(self, buckets):
+        """Returns the value used for each of an array of bucket indices,
+        limited to the range of the values counted."""
+        values = 2.0 * numpy.power(self.gamma, buckets) / (self.gamma + 1.0)
+        return numpy.clip(values, self.min, self.max)
+
+    def get_quantiles(self, quantiles):
+        """Takes an array of quantiles, from 0 to 1, and returns an array of
+        their values. For quantile q, this is within the relative accuracy of
+        the value ranked floor(q * (count - 1)) among the values counted,
+        starting from 0. Values counted as 0 are returned as 0, limited to the
+        range of the values. Returns NaNs if the sketch is empty."""
+        self.flush()
+        quantiles = numpy.asarray(quantiles, dtype=numpy.float64)
+        if self.count == 0:
+            return numpy.full(quantiles.shape, numpy.nan)
+        ranks = numpy.floor(quantiles * (self.count - 1))
+        cumulative = self.zero_count + numpy.cumsum(self.counts)
+        buckets = numpy.searchsorted(cumulative, ranks, "right")
+        buckets = numpy.minimum(buckets, max(len(self.counts) - 1, 0))
+        values = self.get_bucket_values(self.offset + buckets)
+        zero = numpy.clip(0.0, self.min, self.max)
+        return numpy.where(ranks < self.zero_count, zero, values)
+
+    def get_cdf(self):
+        """Returns a CDF of the values, in the same form as
+        view_times_cdf.convert_values_to_cdf: a list holding an array of
+        values and an array of the percentage of values up to and including
+        each. There is one point per nonempty bucket, using the bucket's
+        value."""
+        self.flush()
+        if self.count == 0:
+            return [[], []]
+        nonempty = numpy.flatnonzero(self.counts)
+        values = self.get_bucket_values(self.offset + nonempty)
+        counts = self.counts[nonempty]
+        if self.zero_count != 0:
+            values = numpy.concatenate(([numpy.clip(0.0, self.min, self.max)],
+                values))
+            counts = numpy.concatenate(([self.zero_count], counts))
+        ratios = numpy.cumsum(counts) * (100.0 / self.count)
+        return [numpy.concatenate(([values[0]], values)),
+            numpy.concatenate(([0.0], ratios))]
+
+class LogSketches(object):
+    """Holds the sketches of the durations in a single log: one for all of
+    the durations of each times key, and for kernel_times and block_times,
+    one per kernel name too, except for kernels without a name. Like a
+    BenchmarkLog, the header values are attributes, set to None if they were
+    missing from the log."""
+    HEADER_FIELDS = ["scenario_name", "benchmark_name", "label"]
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.filename = None
+        self.truncated = False
+        for k in self.HEADER_FIELDS:
+            setattr(self, k, None)
+        # Maps (times key, kernel name) pairs to sketches. The kernel name is
+        # None for the sketch of all of a times key's durations.
+        self.sketches = {}
+
+    def get_sketch(self, times_key, kernel_name=None):
+        """Returns the sketch of the given times key, for the given kernel
+        name or for every duration. An empty sketch is added if needed."""
+        key = (times_key, kernel_name)
+        if not key in self.sketches:
+            self.sketches[key] = QuantileSketch(self.relative_accuracy)
+        return self.sketches[key]
+
+    def get_kernel_names(self, times_key):
+        """Returns the kernel names with sketches for the given times key."""
+        return [k[1] for k in self.sketches if (k[0] == times_key) and
+            (k[1] is not None)]
+
+    def kernel_count(self):
+        if not ("kernel_times", None) in self.sketches:
+            return 0
+        return self.sketches[("kernel_times", None)].get_count()
+
+    def add_entry(self, entry):
+        """Adds the durations in a single (parsed) object from the log's
+        "times" array."""
+        if "cpu_times" in entry:
+            for k in benchmark_log.CPU_TIMES_KEYS:
+                times = entry.get(k, entry["cpu_times"])
+                self.get_sketch(k).append(times[1] - times[0])
+            return
+        # The first entry in the times array is an empty object.
+        if not "block_times" in entry:
+            return
+        # The runner leaves out the names of unnamed kernels. Their sketches
+        # would have the key of the sketches of every duration, so they only
+        # have those.
+        name = entry.get("kernel_name")
+        times = entry["kernel_times"]
+        self.get_sketch("kernel_times").append(times[1] - times[0])
+        block_times = numpy.asarray(entry["block_times"], dtype=numpy.float64)
+        durations = block_times[1::2] - block_times[0::2]
+        self.get_sketch("block_times").extend(durations)
+        if name is not None:
+            self.get_sketch("kernel_times", name).append(times[1] - times[0])
+            self.get_sketch("block_times", name).extend(durations)
+
+    def add_benchmark(self, benchmark):
+        """Adds every duration in a BenchmarkLog."""
+        for times_key in ["kernel_times", "block_times"] + \
+            benchmark_log.CPU_TIMES_KEYS:
+            durations = benchmark.get_durations(times_key)
+            self.get_sketch(times_key).add(durations)
+            name_ids = benchmark.get_kernel_name_ids(times_key)
+            if name_ids is None:
+                continue
+            for i in range(len(benchmark.kernel_names)):
+                if benchmark.kernel_names[i] is None:
+                    continue
+                self.get_sketch(times_key, benchmark.kernel_names[i]).add(
+                    durations[name_ids == i])
+
+    def finish(self, header, filename=None, truncated=False):
+        """Sets the header values, once the whole log has been added, and
+        counts any buffered durations."""
+        self.filename = filename
+        self.truncated = truncated
+        for k in self.HEADER_FIELDS:
+            setattr(self, k, header.get(k))
+        for sketch in self.sketches.values():
+            sketch.flush()
+
+    def get_fields(self):
+        """Returns a dict of the sketches' contents, for storing in a
+        LogCache."""
+        keys = sorted(self.sketches)
+        sketches = [self.sketches[k] for k in keys]
+        for s in sketches:
+            s.flush()
+        fields = dict((k, getattr(self, k)) for k in self.HEADER_FIELDS)
+        fields["truncated"] = self.truncated
+        fields["sketch_version"] = SKETCH_VERSION
+        fields["relative_accuracy"] = self.relative_accuracy
+        fields["sketch_keys"] = [list(k) for k in keys]
+        fields["sketch_offsets"] = numpy.array([s.offset for s in sketches],
+            dtype=numpy.int64)
+        fields["sketch_sizes"] = numpy.array([len(s.counts) for s in
+            sketches], dtype=numpy.int64)
+        fields["sketch_counts"] = numpy.concatenate([numpy.zeros(0,
+            dtype=numpy.int64)] + [s.counts for s in sketches])
+        fields["sketch_stats"] = numpy.array([[s.zero_count, s.count, s.mean,
+            s.m2, s.min, s.max] for s in sketches],
+            dtype=numpy.float64).reshape((-1, 6))
+        return fields
+
+def sketches_from_fields(fields, filename):
+    """Returns the LogSketches stored in a LogCache as the given fields, or
+    None if they were stored by another version or with another accuracy."""
+    if (fields.get("sketch_version") != SKETCH_VERSION) or (
+        fields.get("relative_accuracy") != RELATIVE_ACCURACY):
+        return None
+    log = LogSketches()
+    log.filename = filename
+    log.truncated = fields["truncated"]
+    for k in LogSketches.HEADER_FIELDS:
+        setattr(log, k, fields[k])
+    ends = numpy.cumsum(fields["sketch_sizes"])
+    for i, key in enumerate(fields["sketch_keys"]):
+        sketch = log.get_sketch(key[0], key[1])
+        zero_count, count, mean, m2, minimum, maximum = \
+            fields["sketch_stats"][i]
+        sketch.offset = int(fields["sketch_offsets"][i])
+        sketch.counts = fields["sketch_counts"][ends[i] -
+            fields["sketch_sizes"][i]:ends[i]]
+        sketch.zero_count = int(zero_count)
+        sketch.count = int(count)
+        sketch.mean = mean
+        sketch.m2 = m2
+        sketch.min = minimum
+        sketch.max = maximum
+    return log
+
+def load_sketches(filename, cache=None, window=None):
+    """Returns the LogSketches of the JSON log at the given path. The log is
+    parsed one entry at a time, and only the sketches are kept. If a LogCache
+    is given, the sketches are loaded from the cache if it holds an
+    up-to-date copy, and added to the cache otherwise. If window is a (start,
+    end) pair of times, the sketches only count the kernels overlapping it,
+    loaded using benchmark_log.load_window."""
+    if window is not None:
+        log = LogSketches()
+        benchmark = benchmark_log.load_window(filename, window[0], window[1],
+            cache)
+        log.add_benchmark(benchmark)
+        log.finish(dict((k, getattr(benchmark, k)) for k in
+            LogSketches.HEADER_FIELDS), filename, benchmark.truncated)
+        return log
+    if cache is not None:
+        fields = cache.load(filename, CACHE_KIND)
+        if fields is not None:
+            try:
+                log = sketches_from_fields(fields, filename)
+                if log is not None:
+                    return log
+            except (KeyError, IndexError, TypeError, ValueError):
+                pass
+        status = os.stat(filename)
+    log = LogSketches()
+    with open(filename) as f:
+        parser = log_parser.LogParser(f)
+        for entry in parser:
+            log.add_entry(entry)
+    log.finish(parser.header, filename, parser.truncated)
+    if cache is not None:
+        cache.store(filename, status, log.get_fields(), CACHE_KIND)
+    return log
+
+def load_sketches_args(args):
+    """Calls load_sketches with a tuple of arguments, for use with a
+    multiprocessing pool."""
+    return load_sketches(*args)
+
+def load_all_sketches(filenames, cache=None, jobs=1, window=None):
+    """Takes a list of filenames and returns a list of LogSketches, one per
+    file, like benchmark_log.load_benchmark_logs. The files are loaded by a
+    pool of the given number of processes, or one process per CPU if jobs is
+    None."""
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(filenames))
+    if jobs <= 1:
+        return [load_sketches(name, cache, window) for name in filenames]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        logs = pool.map(load_sketches_args,
+            [(name, cache, window) for name in filenames], 1)
+    finally:
+        pool.close()
+        pool.join()
+    return logs
@@ -0,0 +1,206 @@
+# This file contains the code for measuring how busy each SM was while a
+# scenario ran, from the SM ID, times and resource use of every block. For each
+# benchmark, and for all of a scenario's benchmarks together, it computes each
+# SM's busy fraction (the fraction of the scenario's time during which any of
+# the blocks were running on it), and the average and peak fraction of the SM's
+# threads and shared memory the blocks occupied. The same metrics are computed
+# for the GPU as a whole, with thread occupancy normalized by
+# max_resident_threads.
+#
+# Every metric comes from a sweep over the blocks' start and end events, sorted
+# by SM and time, using cumulative sums rather than a loop over blocks, so
+# millions of blocks take a few seconds.
+#
+# Usage: python sm_utilization.py [options] [results directory]
+#
+# The results directory defaults to ./results. The table is written to stdout
+# as JSON unless --output or --format is given. Run with --help to list the
+# options.
+import benchmark_log
+import collections
+import latency_report
+import latency_stats
+import numpy
+import sys
+import viewer_options
+
+# The columns of the utilization table, in order. The sm column is None for
+# the rows covering the whole GPU, and the benchmark and label are None for
+# the rows covering all of a scenario's benchmarks.
+UTILIZATION_COLUMNS = ["scenario", "benchmark", "label", "sm",
+    "busy_fraction", "thread_occupancy", "shared_memory_occupancy",
+    "peak_thread_occupancy", "peak_shared_memory_occupancy"]
+
+def get_sm_usage(starts, ends, sms, threads, shared_memory, sm_count,
+    window_start, window_end):
+    """Takes arrays holding the start and end times, SM, thread count and
+    shared memory of every block, and returns a dict of arrays with one entry
+    per SM from 0 to sm_count - 1: the time during which any block was running
+    ("busy_time"), the integrals over time of the threads and shared memory in
+    use ("thread_time" and "shared_memory_time"), and the most threads and
+    shared memory in use at once ("peak_threads" and "peak_shared_memory").
+    Only the part of each block between the window's start and end times is
+    counted, and blocks on other SMs are ignored."""
+    starts = numpy.clip(starts, window_start, window_end)
+    ends = numpy.clip(ends, window_start, window_end)
+    keep = (ends > starts) & (sms < sm_count)
+    starts = starts[keep]
+    ends = ends[keep]
+    sms = sms[keep].astype(numpy.int64)
+    threads = threads[keep].astype(numpy.int64)
+    shared_memory = shared_memory[keep].astype(numpy.int64)
+    durations = ends - starts
+    usage = {
+        "thread_time": numpy.bincount(sms, weights=threads * durations,
+            minlength=sm_count),
+        "shared_memory_time": numpy.bincount(sms,
+            weights=shared_memory * durations, minlength=sm_count),
+        "busy_time": numpy.zeros(sm_count),
+        "peak_threads": numpy.zeros(sm_count, dtype=numpy.int64),
+        "peak_shared_memory": numpy.zeros(sm_count, dtype=numpy.int64),
+    }
+    if len(starts) == 0:
+        return usage
+
+    # Each block ends with a -1 event and starts with a +1 event. Sorting the
+    # events by SM and time, with ends before starts at the same time, makes
+    # the running sums of the events the blocks, threads and shared memory in
+    # use on each SM after each event. Every SM's events sum to 0, so the sums
+    # needn't be restarted for each SM. The ends come first, so two stable
+    # sorts, by time and then by SM, put the events in order. These are much
+    # faster than a lexsort, especially with the SMs in a small integer type.
+    times = numpy.concatenate((ends, starts))
+    event_sms = numpy.concatenate((sms, sms)).astype(
+        numpy.min_scalar_type(sm_count))
+    order = numpy.argsort(times, kind="mergesort")
+    order = order[numpy.argsort(event_sms[order], kind="mergesort")]
+    times = times[order]
+    event_sms = event_sms[order].astype(numpy.int64)
+    signs = numpy.concatenate((-numpy.ones(len(ends), dtype=numpy.int64),
+        numpy.ones(len(starts), dtype=numpy.int64)))
+    running = numpy.cumsum(signs[order])
+    running_threads = numpy.cumsum(numpy.concatenate((-threads,
+        threads))[order])
+    running_shared_memory = numpy.cumsum(numpy.concatenate((-shared_memory,
+        shared_memory))[order])
+
+    # An SM is busy from each event after which a block is running until its
+    # next event.
+    same_sm = event_sms[1:] == event_sms[:-1]
+    gaps = numpy.where(same_sm & (running[:-1] > 0), times[1:] - times[:-1],
+        0.0)
+    usage["busy_time"] = numpy.bincount(event_sms[:-1], weights=gaps,
+        minlength=sm_count)
+    firsts = numpy.flatnonzero(numpy.concatenate(([True], ~same_sm)))
+    usage["peak_threads"][event_sms[firsts]] = numpy.maximum.reduceat(
+        running_threads, firsts)
+    usage["peak_shared_memory"][event_sms[firsts]] = numpy.maximum.reduceat(
+        running_shared_memory, firsts)
+    return usage
+
+def get_block_arrays(benchmarks):
+    """Returns the block start times, end times, SMs, thread counts and shared
+    memory of every block in the given BenchmarkLogs, as five arrays."""
+    columns = zip(*[[b.block_start, b.block_end, b.block_smid,
+        b.get_block_thread_counts(), b.get_block_shared_memory()]
+        for b in benchmarks])
+    return [numpy.concatenate(c) for c in columns]
+
+def get_usage_rows(scenario, benchmark, label, benchmarks, sm_count,
+    window_start, window_end):
+    """Returns the utilization rows for the blocks of the given BenchmarkLogs:
+    one per SM, followed by one for the whole GPU."""
+    starts, ends, sms, threads, shared_memory = get_block_arrays(benchmarks)
+    window = float(window_end - window_start)
+    per_sm = get_sm_usage(starts, ends, sms, threads, shared_memory, sm_count,
+        window_start, window_end)
+    # The GPU is treated as one SM with the resources of all of them.
+    whole = get_sm_usage(starts, ends, numpy.zeros(len(sms),
+        dtype=numpy.int64), threads, shared_memory, 1, window_start,
+        window_end)
+    rows = []
+    for sm in range(sm_count + 1):
+        if sm < sm_count:
+            usage = dict((k, v[sm]) for k, v in per_sm.items())
+            sm_threads = benchmark_log.SM_THREADS
+            sm_shared_memory = benchmark_log.SM_SHARED_MEM
+        else:
+            usage = dict((k, v[0]) for k, v in whole.items())
+            sm_threads = benchmark_log.SM_THREADS * sm_count
+            sm_shared_memory = benchmark_log.SM_SHARED_MEM * sm_count
+        row = collections.OrderedDict()
+        row["scenario"] = scenario
+        row["benchmark"] = benchmark
+        row["label"] = label
+        row["sm"] = sm if sm < sm_count else None
+        row["busy_fraction"] = float(usage["busy_time"]) / window
+        row["thread_occupancy"] = float(usage["thread_time"]) / (window *
+            sm_threads)
+        row["shared_memory_occupancy"] = float(usage["shared_memory_time"]) / \
+            (window * sm_shared_memory)
+        row["peak_thread_occupancy"] = float(usage["peak_threads"]) / \
+            sm_threads
+        row["peak_shared_memory_occupancy"] = \
+            float(usage["peak_shared_memory"]) / sm_shared_memory
+        rows.append(row)
+    return rows
+
+def get_utilization_rows(benchmarks, window_start=None, window_end=None):
+    """Takes a list of BenchmarkLogs and returns a list of utilization rows,
+    each a dict mapping the names in UTILIZATION_COLUMNS to values. Each
+    scenario's rows cover the time from the earliest kernel start to the
+    latest kernel end of its benchmarks, limited to the given window. The
+    number of SMs is max_resident_threads divided by SM_THREADS, so the
+    thread occupancy of the whole GPU is normalized by max_resident_threads.
+    The rows for each benchmark are followed by the rows for all of the
+    scenario's benchmarks together."""
+    scenarios = benchmark_log.group_by_scenario(benchmarks)
+    rows = []
+    for scenario in sorted(scenarios):
+        logs = [b for b in scenarios[scenario] if b.kernel_count() != 0]
+        logs.sort(key=lambda b: (b.label, b.benchmark_name))
+        if len(logs) == 0:
+            continue
+        start = min(b.kernel_start.min() for b in logs)
+        end = max(b.kernel_end.max() for b in logs)
+        if window_start is not None:
+            start = max(start, window_start)
+        if window_end is not None:
+            end = min(end, window_end)
+        if end <= start:
+            continue
+        sm_count = logs[0].max_resident_threads // benchmark_log.SM_THREADS
+        for b in logs:
+            rows.extend(get_usage_rows(scenario, b.benchmark_name, b.label,
+                [b], sm_count, start, end))
+        rows.extend(get_usage_rows(scenario, None, None, logs, sm_count, start,
+            end))
+    return rows
+
+def write_csv(rows, f):
+    """Writes the utilization rows to the given file as CSV."""
+    latency_stats.write_csv(rows, f, UTILIZATION_COLUMNS)
+
+# The formats the table may be written in, by file extension.
+UTILIZATION_WRITERS = {
+    "json": latency_stats.write_json,
+    "csv": write_csv,
+}
+
+if __name__ == "__main__":
+    parser = viewer_options.get_argument_parser("Prints how busy each SM " +
+        "was in each scenario.")
+    parser.add_argument("--format", choices=sorted(UTILIZATION_WRITERS.keys()),
+        help="The format of the table. Default: the extension of --output, " +
+        "or json")
+    parser.add_argument("-o", "--output",
+        help="Write the table to this file instead of stdout.")
+    args = parser.parse_args()
+    rows = get_utilization_rows(viewer_options.load_benchmarks(args),
+        args.start_time, args.end_time)
+    write = UTILIZATION_WRITERS[latency_report.get_report_format(args)]
+    if args.output is None:
+        write(rows, sys.stdout)
+    else:
+        with open(args.output, "wb") as f:
+            write(rows, f)
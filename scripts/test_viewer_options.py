@@ -0,0 +1,19 @@
+# This file contains tests of the command-line handling shared by the viewer
+# scripts. To run them:
+#
+#    python scripts/test_viewer_options.py
+import quantile_sketch
+import unittest
+import viewer_options
+
+class SketchArgumentTest(unittest.TestCase):
+    def test_help(self):
+        """The --sketch help, which contains a percent sign, can be shown."""
+        parser = viewer_options.get_argument_parser("Shows something.")
+        viewer_options.add_sketch_argument(parser)
+        text = " ".join(parser.format_help().split())
+        self.assertIn("within %g%% of the true values" %
+            (quantile_sketch.RELATIVE_ACCURACY * 100.0), text)
+
+if __name__ == "__main__":
+    unittest.main()
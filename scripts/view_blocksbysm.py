@@ -3,26 +3,30 @@
 # GPU, including which SM they ran on. For this to work, all result filenames
 # must end in .json.
 #
-# Usage: python view_blocksbysm.py [results directory (default: ./results)]
-import glob
-import json
+# Usage: python view_blocksbysm.py [options] [results directory]
+#
+# The results directory defaults to ./results. Run with --help to list the
+# options.
+#
+# Scroll the mouse wheel over a plot to zoom in or out, drag it to pan, and
+# double click it to show the whole scenario again.
+import benchmark_log
 import math
-import sys
+import matplotlib.patches
+import matplotlib.path
+import numpy
+import os
+import viewer_options
 
 from graphics import *
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
-# Using threads vs shared memory
-SM_THREADS = 2048
-SM_SHARED_MEM = 65536
-#Y_VAL_SOURCE = "sharedmem"
+# Using threads vs shared memory, chosen with --resource
+SM_THREADS = benchmark_log.SM_THREADS
+SM_SHARED_MEM = benchmark_log.SM_SHARED_MEM
 Y_VAL_SOURCE = "threads"
-if Y_VAL_SOURCE == "threads":
-    MAX_YVAL = float(SM_THREADS)
-elif Y_VAL_SOURCE == "sharedmem":
-    MAX_YVAL = float(SM_SHARED_MEM)
-else:
-    # invalid!
-    MAX_YVAL = 0
+MAX_YVAL = float(benchmark_log.SM_CAPACITY[Y_VAL_SOURCE])
 
 ###################################################
 # Drawing                                         #
@@ -83,11 +87,62 @@ BUFFER_LEGEND = 4
 LEGEND_BOX_SIZE = 20
 
 USE_PATTERNS = True
+
+# Patterns are drawn by stippling each block with one of the bitmaps in the
+# patterns directory, which takes a single canvas item per block. Some Tk
+# versions (e.g. on macOS) don't support stipples, so set to False to draw
+# the lines of each pattern separately instead.
+USE_STIPPLE_PATTERNS = True
+PATTERN_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns")
 USE_BOLD_FONT = True
 
 LINE_WIDTH = 2
 ARROW_WIDTH = 2
 
+# Blocks narrower than this many pixels aren't drawn individually. Instead,
+# they're combined into one occupancy bar per SM and pixel column, colored by
+# the stream which used the SM the most in that column. Set to 0 to always
+# draw every block.
+LOD_MIN_BLOCK_WIDTH = 4
+
+# The window is only redrawn once it has stopped changing size for this many
+# milliseconds.
+RESIZE_DELAY_MS = 100
+
+# When the window is resized, the plot area, bars and blocks already on the
+# canvas are stretched to fit instead of being created again. Once the plot's
+# width has changed by more than this factor since they were created, they're
+# drawn again so that the occupancy bars match the new width.
+MAX_RESIZE_SCALE = 1.5
+
+# Draw the blocks into a single image instead of creating canvas items for
+# each one. Suits dense scenarios, since drawing takes time proportional to
+# the window's size rather than to the number of blocks. Blocks aren't
+# labelled in the image.
+USE_RASTER = False
+
+# The tag given to every canvas item which is stretched when resizing.
+PLOT_TAG = "plot"
+
+# Scrolling the mouse wheel over the plot zooms in or out by this factor,
+# keeping the time under the pointer in place. Dragging pans, and a double
+# click shows the whole scenario again. The plot never shows less than
+# MIN_VIEW_TIME seconds.
+ZOOM_FACTOR = 1.25
+MIN_VIEW_TIME = 1e-7
+
+# While zooming or panning, the plot is redrawn at most once every this many
+# milliseconds, i.e. about 30 times per second.
+FRAME_DELAY_MS = 33
+
+# When more than this many blocks are in view, each stream's average usage of
+# each SM is shown instead of its blocks, unless LOD_MIN_BLOCK_WIDTH is 0.
+MAX_VISIBLE_BLOCKS = 20000
+
+# The number of equal slices of the scenario's time for which the usage of
+# each SM is summarized when drawing the average usage.
+OCCUPANCY_SLICES = 16384
+
 class Pattern(object):
     def __init__(self):
         self.objs = []
@@ -98,6 +153,8 @@ class Pattern(object):
 
 class HorizontalLinePattern(Pattern):
     LINE_SPACING = 10
+    STIPPLE = "horizontal.xbm"
+    HATCH = "-"
 
     def __init__(self, rect, color, numLines = None):
         Pattern.__init__(self)
@@ -122,6 +179,8 @@ class HorizontalLinePattern(Pattern):
 
 class VerticalLinePattern(Pattern):
     LINE_SPACING = 10
+    STIPPLE = "vertical.xbm"
+    HATCH = "|"
 
     def __init__(self, rect, color, numLines = None):
         Pattern.__init__(self)
@@ -146,6 +205,8 @@ class VerticalLinePattern(Pattern):
 
 class LeftDiagonalLinePattern(Pattern):
     LINE_SPACING = 10
+    STIPPLE = "left_diagonal.xbm"
+    HATCH = "\\"
 
     def __init__(self, rect, color, numLines = None):
         Pattern.__init__(self)
@@ -193,6 +254,8 @@ class LeftDiagonalLinePattern(Pattern):
 
 class RightDiagonalLinePattern(Pattern):
     LINE_SPACING = 10
+    STIPPLE = "right_diagonal.xbm"
+    HATCH = "/"
 
     def __init__(self, rect, color, numLines = None):
         Pattern.__init__(self)
@@ -238,6 +301,26 @@ class RightDiagonalLinePattern(Pattern):
             line.setWidth(LINE_WIDTH)
             self.objs.append(line)
 
+def get_stipple(patternType):
+    return "@" + os.path.join(PATTERN_DIRECTORY, patternType.STIPPLE)
+
+class StipplePattern(Pattern):
+    def __init__(self, rect, color, patternType):
+        Pattern.__init__(self)
+
+        xmin = min(rect.getP1().x, rect.getP2().x)
+        xmax = max(rect.getP1().x, rect.getP2().x)
+        ymin = min(rect.getP1().y, rect.getP2().y)
+        ymax = max(rect.getP1().y, rect.getP2().y)
+
+        # Stay inside the rectangle's outline
+        fill = Rectangle(Point(xmin+1, ymin+1), Point(xmax-1, ymax-1))
+        fill.setFill(color)
+        fill.setOutline("")
+        fill.setWidth(0)
+        fill.setStipple(get_stipple(patternType))
+        self.objs.append(fill)
+
 idToPatternMap = {0: HorizontalLinePattern,
                   1: RightDiagonalLinePattern,
                   2: VerticalLinePattern,
@@ -260,6 +343,13 @@ idToPatternMap = {0: HorizontalLinePattern,
                   19: HorizontalLinePattern,
                   20: VerticalLinePattern}
 
+def get_x_pixels(times, firstTime, totalTime, w):
+    # The same as the x coordinates computed for BlockSMRects. Times outside
+    # of the view are placed at the plot's edges.
+    plotWidth = w - BUFFER_LEFT - BUFFER_RIGHT
+    x = (times - firstTime) / float(totalTime) * plotWidth
+    return numpy.clip(x, 0, plotWidth).astype(numpy.int64) + BUFFER_LEFT
+
 class PlotRect(Rectangle):
     def __init__(self, w, h):
         # Bottom left
@@ -274,72 +364,325 @@ class PlotRect(Rectangle):
         self.setFill("white")
         self.setWidth(LINE_WIDTH)
 
-class BlockSMRect(object):
-    def __init__(self, block, firstTime, totalTime, totalNumSms, w, h, color, patternType, otherThreads):
-        self.build_rectangle(block, firstTime, totalTime, totalNumSms, w, h, color, patternType, otherThreads)
-        self.build_label(block, firstTime, totalTime, totalNumSms, w, h, color, otherThreads)
+class BlockSMRects(object):
+    def __init__(self, kernel, blockIdxs, firstTime, totalTime, totalNumSms, w, h, color, patternType):
+        self.build_rectangles(kernel, blockIdxs, firstTime, totalTime, totalNumSms, w, h, color, patternType)
+        self.build_labels(kernel, blockIdxs)
 
-    def build_rectangle(self, block, firstTime, totalTime, totalNumSms, w, h, color, patternType, otherThreads):
-        # Height is fraction of an SM: 2048 threads/SM, with block.numThreads threads in block
+    def build_rectangles(self, kernel, blockIdxs, firstTime, totalTime, totalNumSms, w, h, color, patternType):
+        # Height is fraction of an SM: 2048 threads/SM, with kernel.threadCount threads in block
         plotHeight = h - BUFFER_TOP - LEGEND_HEIGHT - BUFFER_LEGEND - BUFFER_BOTTOM
         plotBottom = h - BUFFER_BOTTOM
         smHeight = plotHeight / totalNumSms
-        smBottom = plotBottom - int((block.sm) * smHeight)
-        if Y_VAL_SOURCE == "threads":
-            blockHeight = smHeight / MAX_YVAL * block.numThreads
-        else:
-            blockHeight = smHeight / MAX_YVAL * block.sharedMemCount
-
-        otherHeight = smHeight / MAX_YVAL * otherThreads
-        blockBottom = smBottom - otherHeight
-        blockTop = blockBottom - blockHeight
-        
-        p1x = int(float(block.start - firstTime) / totalTime * (w-BUFFER_LEFT-BUFFER_RIGHT)) + BUFFER_LEFT
-        p1y = blockBottom
-
-        p2x = int(float(block.end - firstTime) / totalTime * (w-BUFFER_LEFT-BUFFER_RIGHT)) + BUFFER_LEFT
-        p2y = blockTop
-
-        self.block = Rectangle(Point(p1x, p1y), Point(p2x, p2y))
-        self.block.setWidth(LINE_WIDTH)
-        if patternType == None:
-            self.block.setFill(color)
-            self.pattern = None
+        smBottoms = plotBottom - (kernel.blockSms[blockIdxs] * smHeight).astype(numpy.int64)
+        blockHeight = smHeight / MAX_YVAL * kernel.get_yval()
+
+        # The competing threadcount was computed once for the scenario
+        otherHeights = smHeight / MAX_YVAL * kernel.blockBases[blockIdxs]
+        self.bottoms = smBottoms - otherHeights
+        self.tops = self.bottoms - blockHeight
+
+        self.lefts = get_x_pixels(kernel.blockStarts[blockIdxs], firstTime, totalTime, w)
+        self.rights = get_x_pixels(kernel.blockEnds[blockIdxs], firstTime, totalTime, w)
+
+        self.color = color
+        self.patternType = patternType
+        self.lines = None
+        if patternType == None or USE_STIPPLE_PATTERNS: return
+
+        # Gather the lines of every block's pattern, to be drawn together
+        lines = []
+        for j in range(len(blockIdxs)):
+            rect = Rectangle(Point(self.lefts[j], self.bottoms[j]), Point(self.rights[j], self.tops[j]))
+            for line in patternType(rect, color).objs:
+                lines.append((line.p1.x, line.p1.y, line.p2.x, line.p2.y))
+        self.lines = numpy.array(lines, dtype=numpy.float64).reshape((-1, 4))
+
+    def build_labels(self, kernel, blockIdxs):
+        self.labelXs = (self.lefts + self.rights) // 2
+        self.labelYs = (self.tops + self.bottoms) / 2
+        self.labels = ["%s: %s" % (kernel.kernelName, blockIdx) for blockIdx in blockIdxs]
+
+    def draw(self, batch):
+        if self.patternType == None:
+            batch.addRectangles(self.lefts.tolist(), self.bottoms.tolist(), self.rights.tolist(), self.tops.tolist(),
+                                {"fill": self.color, "width": LINE_WIDTH})
         else:
-            self.block.setFill(patternColorToBgColorMap[color])
-            self.pattern = patternType(self.block, color)
+            batch.addRectangles(self.lefts.tolist(), self.bottoms.tolist(), self.rights.tolist(), self.tops.tolist(),
+                                {"fill": patternColorToBgColorMap[self.color], "width": LINE_WIDTH})
+        if self.lines is not None:
+            batch.addLines(self.lines[:, 0].tolist(), self.lines[:, 1].tolist(), self.lines[:, 2].tolist(),
+                           self.lines[:, 3].tolist(), {"fill": self.color, "width": LINE_WIDTH})
+        elif self.patternType != None:
+            # Stay inside the rectangles' outlines
+            batch.addRectangles((self.lefts + 1).tolist(), (self.bottoms - 1).tolist(), (self.rights - 1).tolist(),
+                                (self.tops + 1).tolist(),
+                                {"fill": self.color, "outline": "", "width": 0, "stipple": get_stipple(self.patternType)})
+        font = ("helvetica", 12, "bold" if USE_BOLD_FONT else "normal")
+        batch.addTexts(self.labelXs.tolist(), self.labelYs.tolist(), self.labels, {"font": font})
+
+class OccupancyBars(object):
+    def __init__(self, benchmark, visible, colors, firstTime, totalTime, totalNumSms, w, h):
+        self.streams = numpy.zeros(0, dtype=numpy.int64)
+        self.colors = colors
+        self.build_bars(benchmark, visible, colors, firstTime, totalTime, totalNumSms, w, h)
+
+    def build_bars(self, benchmark, visible, colors, firstTime, totalTime, totalNumSms, w, h):
+        # Gather the narrow blocks from every stream
+        sms = []
+        lefts = []
+        rights = []
+        bottoms = []
+        tops = []
+        weights = []
+        streamIdxs = []
+        for i in range(len(benchmark.streams)):
+            stream = benchmark.streams[i]
+            log = stream.log
+            p1x = get_x_pixels(log.block_start[visible[i]], firstTime, totalTime, w)
+            p2x = get_x_pixels(log.block_end[visible[i]], firstTime, totalTime, w)
+            narrowVisible = (p2x - p1x) < LOD_MIN_BLOCK_WIDTH
+            narrow = visible[i][narrowVisible]
+            p1x = p1x[narrowVisible]
+            p2x = p2x[narrowVisible]
+            yvals = stream.get_block_yvals()[narrow]
+            sms.append(log.block_smid[narrow])
+            lefts.append(p1x)
+            rights.append(numpy.maximum(p2x, p1x + 1))
+            bottoms.append(stream.blockBases[narrow])
+            tops.append(stream.blockBases[narrow] + yvals)
+            weights.append(yvals * (log.block_end[narrow] - log.block_start[narrow]))
+            streamIdxs.append(numpy.full(len(yvals), i, dtype=numpy.int64))
+        if len(sms) == 0: return
+        sms = numpy.concatenate(sms).astype(numpy.int64)
+        if len(sms) == 0: return
+        lefts = numpy.concatenate(lefts)
+        rights = numpy.concatenate(rights)
+
+        # Split each block into one piece per pixel column it covers
+        counts = rights - lefts
+        pieces = numpy.repeat(numpy.arange(len(sms)), counts)
+        cols = lefts[pieces] + numpy.arange(len(pieces)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        sms = sms[pieces]
+        bottoms = numpy.concatenate(bottoms)[pieces]
+        tops = numpy.concatenate(tops)[pieces]
+        weights = (numpy.concatenate(weights) / counts)[pieces]
+        streamIdxs = numpy.concatenate(streamIdxs)[pieces]
+
+        # Find the extent of the blocks in each SM and column
+        order = numpy.lexsort((streamIdxs, cols, sms))
+        sms = sms[order]
+        cols = cols[order]
+        streamIdxs = streamIdxs[order]
+        newBar = numpy.ones(len(order), dtype=bool)
+        newBar[1:] = (sms[1:] != sms[:-1]) | (cols[1:] != cols[:-1])
+        barStarts = numpy.flatnonzero(newBar)
+        barBottoms = numpy.minimum.reduceat(bottoms[order], barStarts)
+        barTops = numpy.maximum.reduceat(tops[order], barStarts)
+
+        # Find the stream with the largest share of each bar
+        newShare = newBar.copy()
+        newShare[1:] |= streamIdxs[1:] != streamIdxs[:-1]
+        shareStarts = numpy.flatnonzero(newShare)
+        shares = numpy.add.reduceat(weights[order], shareStarts)
+        shareBars = numpy.cumsum(newBar)[shareStarts] - 1
+        shareOrder = numpy.lexsort((-shares, shareBars))
+        firstShares = numpy.ones(len(shareOrder), dtype=bool)
+        firstShares[1:] = shareBars[shareOrder][1:] != shareBars[shareOrder][:-1]
+        barStreams = streamIdxs[shareStarts][shareOrder[firstShares]]
+
+        # Merge neighboring columns with identical bars
+        barSms = sms[barStarts]
+        barCols = cols[barStarts]
+        newRun = numpy.ones(len(barStarts), dtype=bool)
+        newRun[1:] = ((barSms[1:] != barSms[:-1]) | (barCols[1:] != barCols[:-1] + 1) |
+                      (barBottoms[1:] != barBottoms[:-1]) | (barTops[1:] != barTops[:-1]) |
+                      (barStreams[1:] != barStreams[:-1]))
+        runStarts = numpy.flatnonzero(newRun)
+        runEnds = numpy.append(runStarts[1:], len(barStarts)) - 1
 
-    def build_label(self, block, firstTime, totalTime, totalNumSms, w, h, color, otherThreads):
-        # Height is fraction of an SM: 2048 threads/SM, with block.numThreads threads in block
         plotHeight = h - BUFFER_TOP - LEGEND_HEIGHT - BUFFER_LEGEND - BUFFER_BOTTOM
         plotBottom = h - BUFFER_BOTTOM
         smHeight = plotHeight / totalNumSms
-        smBottom = plotBottom - int((block.sm) * smHeight)
-        if Y_VAL_SOURCE == "threads":
-            blockHeight = smHeight / MAX_YVAL * block.numThreads
-        else:
-            blockHeight = smHeight / MAX_YVAL * block.sharedMemCount
-
-        otherHeight = smHeight / MAX_YVAL * otherThreads
-        blockBottom = smBottom - otherHeight
-        blockTop = blockBottom - blockHeight
-
-        blockLeft = int(float(block.start - firstTime) / totalTime * (w-BUFFER_LEFT-BUFFER_RIGHT)) + BUFFER_LEFT
-        blockRight = int(float(block.end - firstTime) / totalTime * (w-BUFFER_LEFT-BUFFER_RIGHT)) + BUFFER_LEFT
-
-        px = (blockLeft + blockRight) / 2
-        py = (blockTop + blockBottom) / 2
-
-        kernelName = block.kernelName
-        self.label = Text(Point(px, py), "%s: %s" % (kernelName, block.id))
-        if USE_BOLD_FONT:
-            self.label.setStyle("bold")
+        smBottoms = plotBottom - (barSms[runStarts] * smHeight).astype(numpy.int64)
+        self.lefts = barCols[runStarts]
+        self.rights = barCols[runEnds] + 1
+        self.bottoms = smBottoms - smHeight / MAX_YVAL * barBottoms[runStarts]
+        self.tops = smBottoms - smHeight / MAX_YVAL * barTops[runStarts]
+        self.streams = barStreams[runStarts]
+        self.colors = colors
+
+    def draw(self, batch):
+        if len(self.streams) == 0: return
+        # Bars of the same color are drawn together
+        for i in range(len(self.colors)):
+            bars = self.streams == i
+            color = self.colors[i]
+            batch.addRectangles(self.lefts[bars].tolist(), self.bottoms[bars].tolist(), self.rights[bars].tolist(),
+                                self.tops[bars].tolist(), {"fill": color, "outline": color, "width": 0})
+
+class OccupancyAreas(object):
+    """Each stream's average usage of each SM during each pixel column, taken
+    from an OccupancySummary. The streams are stacked in order in each SM's
+    row, and each stream's area in a row is drawn as one polygon."""
+    def __init__(self, summary, colors, firstTime, totalTime, totalNumSms, w, h):
+        self.colors = colors
+        self.build_polygons(summary, firstTime, totalTime, totalNumSms, w, h)
+
+    def build_polygons(self, summary, firstTime, totalTime, totalNumSms, w, h):
+        plotWidth = w - BUFFER_LEFT - BUFFER_RIGHT
+        plotHeight = h - BUFFER_TOP - LEGEND_HEIGHT - BUFFER_LEGEND - BUFFER_BOTTOM
+        plotBottom = h - BUFFER_BOTTOM
+        smHeight = plotHeight / totalNumSms
+        times = firstTime + numpy.arange(plotWidth + 1) * (totalTime / float(plotWidth))
+        usage = summary.get_usage(times)
+        tops = numpy.cumsum(usage, axis=0)
+        bottoms = tops - usage
+
+        # Each column's top and bottom are flat, from its left to its right
+        xs = numpy.repeat(numpy.arange(plotWidth) + BUFFER_LEFT, 2)
+        xs[1::2] += 1
+        xs = numpy.concatenate((xs, xs[::-1]))
+        self.polygons = []
+        for i in range(len(usage)):
+            polygons = []
+            for sm in range(totalNumSms):
+                if not (usage[i, sm] > 0).any(): continue
+                smBottom = plotBottom - int(sm * smHeight)
+                upper = smBottom - smHeight / MAX_YVAL * numpy.repeat(tops[i, sm], 2)
+                lower = smBottom - smHeight / MAX_YVAL * numpy.repeat(bottoms[i, sm], 2)
+                ys = numpy.concatenate((upper, lower[::-1]))
+                polygons.append(numpy.column_stack((xs, ys)).ravel().tolist())
+            self.polygons.append(polygons)
+
+    def draw(self, batch):
+        for i in range(len(self.polygons)):
+            batch.addPolygons(self.polygons[i], {"fill": self.colors[i], "outline": "", "width": 0})
+
+patternMaskCache = {}
+
+def get_pattern_mask(patternType):
+    """Returns the pattern's stipple bitmap, read from its XBM file in the
+    patterns directory, as a 2D boolean array of (row, column) pixels."""
+    cache = patternMaskCache
+    if patternType not in cache:
+        f = open(os.path.join(PATTERN_DIRECTORY, patternType.STIPPLE))
+        text = f.read()
+        f.close()
+        width = int(text.split("_width")[1].split()[0])
+        values = text[text.index("{") + 1:text.index("}")].split(",")
+        rows = numpy.array([int(v, 16) for v in values if v.strip() != ""])
+        # Each row is one byte, with the leftmost pixel in the lowest bit
+        cache[patternType] = ((rows[:, None] >> numpy.arange(width)) & 1) == 1
+    return cache[patternType]
+
+def get_covered_pixels(height, width, lefts, tops, rights, bottoms):
+    """Returns a height x width boolean array marking the pixels covered by
+    any of the given rectangles, which include their left column and top row
+    but not their right column or bottom row. Each rectangle adds its corners
+    to a table of differences, whose cumulative sums count the rectangles
+    covering each pixel."""
+    stride = width + 1
+    corners = numpy.concatenate((tops * stride + lefts, tops * stride + rights,
+                                 bottoms * stride + lefts, bottoms * stride + rights))
+    signs = numpy.repeat([1, -1, -1, 1], len(lefts))
+    counts = numpy.bincount(corners, weights=signs, minlength=(height + 1) * stride)
+    counts = counts.reshape((height + 1, stride)).cumsum(0).cumsum(1)
+    return counts[:height, :width] > 0.5
+
+# The characters of the hexadecimal "#rrggbb" colors passed to Tk
+HEX_DIGITS = numpy.frombuffer(b"0123456789abcdef", dtype=numpy.uint8)
+
+def get_photo_data(pixels):
+    """Takes a height x width x 3 array of 8-bit RGB values, and returns them
+    as the string of rows of colors PhotoImage.put expects."""
+    height, width = pixels.shape[:2]
+    # Each pixel becomes "#rrggbb ", and each row "{#rrggbb ... #rrggbb} "
+    chars = numpy.empty((height, width, 8), dtype=numpy.uint8)
+    chars[:, :, 0] = ord("#")
+    chars[:, :, 1:7:2] = HEX_DIGITS[pixels >> 4]
+    chars[:, :, 2:7:2] = HEX_DIGITS[pixels & 15]
+    chars[:, :, 7] = ord(" ")
+    rows = numpy.empty((height, width * 8 + 2), dtype=numpy.uint8)
+    rows[:, 0] = ord("{")
+    rows[:, 1:-1] = chars.reshape((height, width * 8))
+    rows[:, -2] = ord("}")
+    rows[:, -1] = ord(" ")
+    return rows.tostring()
+
+class BlockSMRaster(object):
+    """The blocks of every stream, drawn into an image of the plot area.
+    Each stream's blocks are filled at once, with the stream's pattern
+    applied as a mask. Blocks at least LOD_MIN_BLOCK_WIDTH pixels wide are
+    outlined, and every other block is drawn at least one pixel wide."""
+    def __init__(self, benchmark, visible, colors, patternTypes, firstTime, totalTime, totalNumSms, w, h, get_rgb):
+        self.build_pixels(benchmark, visible, colors, patternTypes, firstTime, totalTime, totalNumSms, w, h, get_rgb)
+
+    def build_pixels(self, benchmark, visible, colors, patternTypes, firstTime, totalTime, totalNumSms, w, h, get_rgb):
+        plotTop = BUFFER_TOP + LEGEND_HEIGHT + BUFFER_LEGEND
+        plotHeight = h - BUFFER_TOP - LEGEND_HEIGHT - BUFFER_LEGEND - BUFFER_BOTTOM
+        plotBottom = h - BUFFER_BOTTOM
+        plotWidth = w - BUFFER_LEFT - BUFFER_RIGHT
+        smHeight = plotHeight / totalNumSms
+        self.left = BUFFER_LEFT
+        self.top = plotTop
+
+        self.pixels = numpy.empty((plotHeight, plotWidth, 3), dtype=numpy.uint8)
+        self.pixels[:, :] = get_rgb("white")
+        # Patterns line up with the canvas, as stipples do
+        rows = numpy.arange(plotTop, plotBottom)[:, None]
+        cols = numpy.arange(BUFFER_LEFT, BUFFER_LEFT + plotWidth)[None, :]
+        for i in range(len(benchmark.streams)):
+            stream = benchmark.streams[i]
+            log = stream.log
+            idxs = visible[i]
+            if len(idxs) == 0: continue
+
+            # The same coordinates as BlockSMRects, relative to the image
+            smBottoms = plotBottom - (log.block_smid[idxs].astype(numpy.int64) * smHeight).astype(numpy.int64)
+            bottoms = smBottoms - smHeight / MAX_YVAL * stream.blockBases[idxs]
+            tops = bottoms - smHeight / MAX_YVAL * stream.get_block_yvals()[idxs]
+            lefts = get_x_pixels(log.block_start[idxs], firstTime, totalTime, w) - BUFFER_LEFT
+            rights = get_x_pixels(log.block_end[idxs], firstTime, totalTime, w) - BUFFER_LEFT
+            outlined = (rights - lefts) >= max(LOD_MIN_BLOCK_WIDTH, 1)
+            tops = numpy.clip(tops.astype(numpy.int64) - plotTop, 0, plotHeight - 1)
+            bottoms = numpy.clip(bottoms.astype(numpy.int64) - plotTop, tops + 1, plotHeight)
+            lefts = numpy.clip(lefts, 0, plotWidth - 1)
+            rights = numpy.clip(rights, lefts + 1, plotWidth)
+
+            covered = get_covered_pixels(plotHeight, plotWidth, lefts, tops, rights, bottoms)
+            color = colors[i]
+            patternType = patternTypes[i]
+            if patternType == None:
+                self.pixels[covered] = get_rgb(color)
+            else:
+                self.pixels[covered] = get_rgb(patternColorToBgColorMap[color])
+                mask = get_pattern_mask(patternType)
+                mask = mask[rows % mask.shape[0], cols % mask.shape[1]]
+                self.pixels[covered & mask] = get_rgb(color)
+
+            # Outline each block with one rectangle per side
+            lefts = lefts[outlined]
+            tops = tops[outlined]
+            rights = rights[outlined]
+            bottoms = bottoms[outlined]
+            edges = get_covered_pixels(plotHeight, plotWidth,
+                numpy.concatenate((lefts, lefts, lefts, rights - 1)),
+                numpy.concatenate((tops, bottoms - 1, tops, tops)),
+                numpy.concatenate((rights, rights, lefts + 1, rights)),
+                numpy.concatenate((tops + 1, bottoms, bottoms, bottoms)))
+            self.pixels[edges] = get_rgb("black")
 
     def draw(self, canvas):
-        self.block.draw(canvas)
-        if self.pattern != None:
-            self.pattern.draw(canvas)
-        self.label.draw(canvas)
+        height, width = self.pixels.shape[:2]
+        photo = tk.PhotoImage(master=canvas.canvas, width=width, height=height)
+        photo.put(get_photo_data(self.pixels))
+        # Images are centered on their anchor point
+        self.image = Image(Point(self.left + width / 2, self.top + height / 2), Pixmap(photo))
+        self.image.draw(canvas)
+
+    def undraw(self):
+        self.image.undraw()
 
 class KernelReleaseMarker(Line):
     def __init__(self, kernel, firstTime, totalTime, totalNumSms, w, h, color, patternType, idx):
@@ -383,7 +726,9 @@ class LegendBox(object):
             self.rect.setFill(patternColorToBgColorMap[color])
 
             patternType = idToPatternMap[i]
-            if patternType == HorizontalLinePattern:
+            if USE_STIPPLE_PATTERNS:
+                self.pattern = StipplePattern(self.rect, color, patternType)
+            elif patternType == HorizontalLinePattern:
                 self.pattern = patternType(self.rect, color, 2)
             elif patternType == VerticalLinePattern:
                 self.pattern = patternType(self.rect, color, 2)
@@ -470,13 +815,24 @@ class Legend(object):
         for label in self.labels:
             label.draw(canvas)
 
+def get_tick_time(totalTime):
+    # Scaled down by powers of 10 when zoomed in to less than a second
+    scale = 1.0
+    while totalTime < scale and scale > MIN_VIEW_TIME:
+        scale /= 10.0
+    if totalTime <= 2.0 * scale:
+        return 0.1 * scale
+    elif totalTime <= 4.0 * scale:
+        return 0.2 * scale
+    return 0.5 * scale
+
 class XAxis(object):
     def __init__(self, firstTime, totalTime, w, h):
         self.build_axis(w, h)
 
         self.calculate_tick_time(totalTime)
-        self.build_tick_marks(totalTime, w, h)
-        self.build_labels(totalTime, w, h)
+        self.build_tick_marks(firstTime, totalTime, w, h)
+        self.build_labels(firstTime, totalTime, w, h)
 
     def build_axis(self, w, h):
         # Draw a thin black horizontal line
@@ -490,21 +846,23 @@ class XAxis(object):
         self.axis.setWidth(LINE_WIDTH)
 
     def calculate_tick_time(self, totalTime):
-        if totalTime <= 2.0:
-            self.tick_time = 0.1
-        elif totalTime <= 4.0:
-            self.tick_time = 0.2
-        else:
-            self.tick_time = 0.5
+        self.tick_time = get_tick_time(totalTime)
+        # Show as many decimals as the tick time has
+        self.tick_decimals = max(1, int(math.ceil(-math.log10(self.tick_time) - 1e-6)))
 
-    def build_tick_marks(self, totalTime, w, h):
+    def get_tick_times(self, firstTime, totalTime):
+        # Every multiple of the tick time inside the plot, except at its edges
+        first = int(math.floor(firstTime / self.tick_time)) + 1
+        last = int(math.ceil((firstTime + totalTime) / self.tick_time))
+        return [i * self.tick_time for i in range(first, last)]
+
+    def build_tick_marks(self, firstTime, totalTime, w, h):
         # Put a tick every 0.1 seconds
         plotWidth = w - BUFFER_LEFT - BUFFER_RIGHT
-        numTicks = int(math.ceil(totalTime / self.tick_time))
         self.ticks = []
-        for i in range(1, numTicks):
+        for time in self.get_tick_times(firstTime, totalTime):
             # Top of plot area
-            px = BUFFER_LEFT + (i * self.tick_time / totalTime) * plotWidth
+            px = BUFFER_LEFT + ((time - firstTime) / totalTime) * plotWidth
             p1y = BUFFER_TOP + LEGEND_HEIGHT + BUFFER_LEGEND + 1
             p2y = BUFFER_TOP + LEGEND_HEIGHT + BUFFER_LEGEND + 5
 
@@ -514,7 +872,7 @@ class XAxis(object):
             self.ticks.append(tick)
 
             # Bottom of plot area
-            px = BUFFER_LEFT + (i * self.tick_time / totalTime) * plotWidth
+            px = BUFFER_LEFT + ((time - firstTime) / totalTime) * plotWidth
             p1y = h - BUFFER_BOTTOM - 0
             p2y = h - BUFFER_BOTTOM - 4
 
@@ -523,16 +881,15 @@ class XAxis(object):
             tick.setWidth(LINE_WIDTH)
             self.ticks.append(tick)
 
-    def build_labels(self, totalTime, w, h):
+    def build_labels(self, firstTime, totalTime, w, h):
         # Put a label every tick mark
         plotWidth = w - BUFFER_LEFT - BUFFER_RIGHT
-        numTicks = int(math.ceil(totalTime / self.tick_time))
         self.labels = []
-        for i in range(1, numTicks):
-            px = BUFFER_LEFT + (i * self.tick_time / totalTime) * plotWidth
+        for time in self.get_tick_times(firstTime, totalTime):
+            px = BUFFER_LEFT + ((time - firstTime) / totalTime) * plotWidth
             py = h - int(BUFFER_BOTTOM * 0.9)
 
-            label = Text(Point(px, py), "%.1f" % (i * self.tick_time))
+            label = Text(Point(px, py), "%.*f" % (self.tick_decimals, time))
             label.setSize(10)
             if USE_BOLD_FONT:
                 label.setStyle("bold")
@@ -619,12 +976,31 @@ class ResizingCanvasFrame(CanvasFrame):
         self.canvas.bind("<Configure>", self.on_resize)
         self.canvas.config(highlightthickness=0)
         self.redrawCallback = redraw_callback
+        self.resizeId = None
 
     def on_resize(self, event):
-        self.redrawCallback(event.width, event.height)
+        # Wait until the window stops changing size to redraw it
+        if self.resizeId != None:
+            self.canvas.after_cancel(self.resizeId)
+        self.resizeId = self.canvas.after(RESIZE_DELAY_MS, self.finish_resize, event.width, event.height)
+
+    def finish_resize(self, width, height):
+        self.resizeId = None
+        self.redrawCallback(width, height)
+
+    def clear_canvas(self, keepTag = None):
+        if keepTag == None:
+            self.canvas.delete("all")
+        else:
+            self.canvas.delete("!" + keepTag)
+
+    def tag_all(self, tag):
+        self.canvas.addtag_all(tag)
 
-    def clear_canvas(self):
-        self.canvas.delete("all")
+    def stretch(self, tag, x, oldY, newY, xScale, yScale):
+        # Scale the tagged items about (x, oldY), then move that point to (x, newY)
+        self.canvas.scale(tag, x, oldY, xScale, yScale)
+        self.canvas.move(tag, 0, newY - oldY)
 
 class BlockSMDisplay():
     INIT_WIDTH = 800
@@ -640,22 +1016,102 @@ class BlockSMDisplay():
         self.firstTime = 0.0
         self.totalTime = (benchmark.get_end() - self.firstTime) * 1.05
 
+        # The view shown when fully zoomed out
+        self.fullFirstTime = self.firstTime
+        self.fullTotalTime = self.totalTime
+
         # Create a canvas
         self.canvas = ResizingCanvasFrame(win, self.width, self.height, self.redraw)
         self.canvas.setBackground("light gray")
 
         self.benchmark = benchmark
+        self.raster = None
+        self.summary = None
+        self.viewId = None
+        self.panX = None
 
         if len(benchmark.streams) > 0:
-            self.numSms = self.benchmark.streams[0].maxResidentThreads / 2048
+            self.numSms = self.benchmark.streams[0].maxResidentThreads / SM_THREADS
             self.name = self.benchmark.streams[0].scenarioName
+            self.index = BlockTimeIndex(benchmark, self.numSms)
+
+        # Zoom with the mouse wheel, and pan by dragging
+        canvas = self.canvas.canvas
+        canvas.bind("<MouseWheel>", self.zoom)
+        canvas.bind("<Button-4>", self.zoom)
+        canvas.bind("<Button-5>", self.zoom)
+        canvas.bind("<ButtonPress-1>", self.start_pan, "+")
+        canvas.bind("<B1-Motion>", self.pan)
+        canvas.bind("<Double-Button-1>", self.reset_view)
+
+    def get_time(self, x):
+        plotWidth = self.get_plot_size()[0]
+        return self.firstTime + float(x - BUFFER_LEFT) / plotWidth * self.totalTime
+
+    def zoom(self, event):
+        if len(self.benchmark.streams) == 0 or min(self.get_plot_size()) <= 0: return
+        # Scrolling up (button 4 on X11) zooms in
+        if event.num == 4 or event.delta > 0:
+            totalTime = max(self.totalTime / ZOOM_FACTOR, MIN_VIEW_TIME)
+        else:
+            totalTime = min(self.totalTime * ZOOM_FACTOR, self.fullTotalTime)
+        time = self.get_time(event.x)
+        self.set_view(time - (time - self.firstTime) * totalTime / self.totalTime, totalTime)
+
+    def start_pan(self, event):
+        self.panX = event.x
+        self.panTime = self.firstTime
+
+    def pan(self, event):
+        if self.panX == None or min(self.get_plot_size()) <= 0: return
+        plotWidth = self.get_plot_size()[0]
+        self.set_view(self.panTime - float(event.x - self.panX) / plotWidth * self.totalTime, self.totalTime)
+
+    def reset_view(self, event):
+        self.set_view(self.fullFirstTime, self.fullTotalTime)
+
+    def set_view(self, firstTime, totalTime):
+        # Stay within the view shown when fully zoomed out
+        firstTime = min(firstTime, self.fullFirstTime + self.fullTotalTime - totalTime)
+        firstTime = max(firstTime, self.fullFirstTime)
+        if firstTime == self.firstTime and totalTime == self.totalTime: return
+        self.firstTime = firstTime
+        self.totalTime = totalTime
+        if self.viewId == None:
+            self.viewId = self.canvas.canvas.after(FRAME_DELAY_MS, self.finish_view_change)
+
+    def finish_view_change(self):
+        self.viewId = None
+        self.canvas.clear_canvas()
+        self.draw_benchmark()
 
     def redraw(self, width, height):
-        self.canvas.clear_canvas()
+        if width == self.width and height == self.height: return
+        if len(self.benchmark.streams) == 0: return
+        oldWidth, oldHeight = self.get_plot_size()
+        oldBottom = self.height - BUFFER_BOTTOM
 
         self.width = width
         self.height = height
-        self.draw_benchmark()
+        newWidth, newHeight = self.get_plot_size()
+        if USE_RASTER or min(oldWidth, oldHeight, newWidth, newHeight) <= 0 or \
+           max(newWidth, self.drawnWidth) > MAX_RESIZE_SCALE * min(newWidth, self.drawnWidth):
+            self.canvas.clear_canvas()
+            self.draw_benchmark()
+            return
+
+        # Reuse the plot area, bars and blocks, and redraw the rest
+        self.canvas.clear_canvas(PLOT_TAG)
+        self.canvas.stretch(PLOT_TAG, BUFFER_LEFT, oldBottom, self.height - BUFFER_BOTTOM,
+                            float(newWidth) / oldWidth, float(newHeight) / oldHeight)
+        self.draw_title()
+        self.draw_legend()
+        self.draw_axes()
+
+    def get_plot_size(self):
+        plotWidth = self.width - BUFFER_LEFT - BUFFER_RIGHT
+        plotHeight = self.height - BUFFER_TOP - LEGEND_HEIGHT - BUFFER_LEGEND - BUFFER_BOTTOM
+        return plotWidth, plotHeight
 
     def draw_benchmark(self):
         global LEGEND_HEIGHT
@@ -668,13 +1124,37 @@ class BlockSMDisplay():
         # Draw the plot area
         self.draw_plot_area()
 
-        # Draw each kernel
-        smBase = [[] for j in range(self.numSms)]
-        releaseDict = {}
+        colors = []
+        patternTypes = []
         for i in range(len(self.benchmark.streams)):
-            color = idToColorMap[i] if USE_PATTERNS else patternColorToArrowColorMap[idToColorMap[i]]
-            patternType = idToPatternMap[i] if USE_PATTERNS else None
-            self.draw_stream(self.benchmark.streams[i], color, patternType, i, smBase, releaseDict)
+            colors.append(idToColorMap[i] if USE_PATTERNS else patternColorToArrowColorMap[idToColorMap[i]])
+            patternTypes.append(idToPatternMap[i] if USE_PATTERNS else None)
+        lastTime = self.firstTime + self.totalTime
+        if USE_RASTER:
+            self.draw_raster(self.index.get_visible(self.firstTime, lastTime), colors, patternTypes)
+        elif LOD_MIN_BLOCK_WIDTH > 0 and self.index.count_visible(self.firstTime, lastTime) > MAX_VISIBLE_BLOCKS:
+            # Too many blocks to draw, so show how much each stream used each SM
+            batch = Batch()
+            self.draw_occupancy_summary(batch, colors)
+            batch.draw(self.canvas)
+        else:
+            # Only the blocks in view are drawn
+            visible = self.index.get_visible(self.firstTime, lastTime)
+
+            # Draw the blocks too narrow to show individually
+            batch = Batch()
+            self.draw_occupancy_bars(batch, visible, colors)
+
+            # Draw each kernel
+            releaseDict = {}
+            for i in range(len(self.benchmark.streams)):
+                self.draw_stream(batch, self.benchmark.streams[i], visible[i], colors[i], patternTypes[i], i,
+                                 releaseDict)
+            batch.draw(self.canvas)
+
+        # Everything drawn so far is stretched when the window is resized
+        self.canvas.tag_all(PLOT_TAG)
+        self.drawnWidth = self.get_plot_size()[0]
 
         # Draw the title, legend, and axes
         self.draw_title()
@@ -685,73 +1165,56 @@ class BlockSMDisplay():
         pr = PlotRect(self.width, self.height)
         pr.draw(self.canvas)
 
-    def draw_stream(self, stream, color, patternType, i, smBase, releaseDict):
-        # Draw each kernel in the stream
-        for kernel in stream.kernels:
-            self.draw_kernel(kernel, color, patternType, i, smBase, releaseDict)
-
-    def draw_kernel(self, kernel, color, patternType, i, smBase, releaseDict):
-        kernelBlocksIdxs = range(len(kernel.blocks)) # allows for easy reordering, if necessary
-
-        # Draw each block of the kernel
-        for blockIdx in kernelBlocksIdxs:
-            block = kernel.blocks[blockIdx]
-            # Calculate competing threadcount
-            otherThreads = 0
-            myOverlap = [(0, self.totalTime, 0, block.sm, "", -1)]
-            for interval in smBase[block.sm]:
-                if interval[0] < block.end and interval[1] > block.start:
-                    # Find the sub-interval of my own that this overlaps for
-                    intervalStart = max(interval[0], block.start)
-                    intervalEnd = min(interval[1], block.end)
-
-                    # Find any interval I've already built up overlap for
-                    myoverlappingintervals = []
-                    for myinterval in myOverlap:
-                        if myinterval[0] < intervalEnd and myinterval[1] > intervalStart:
-                            myoverlappingintervals.append(myinterval)
-
-                    # For each interval I already know about that I overlap with,
-                    # consider a few cases
-                    for myinterval in myoverlappingintervals:
-                        # Check if my interval completely encloses this new one (in that case,
-                        # split at the beginning and end of this new one)
-                        if myinterval[0] <= intervalStart and myinterval[1] >= intervalEnd:
-                            myOverlap.remove(myinterval)
-                            myOverlap.append((myinterval[0], intervalStart, myinterval[2], myinterval[3], myinterval[4], myinterval[5]))
-                            myOverlap.append((intervalStart, intervalEnd, myinterval[2] + interval[2], myinterval[3], myinterval[4], myinterval[5]))
-                            myOverlap.append((intervalEnd, myinterval[1], myinterval[2], myinterval[3], myinterval[4], myinterval[5]))
-
-                        # Otherwise, check if my interval starts before this new one
-                        # (in that case, split on the start time)
-                        elif myinterval[0] <= intervalStart:
-                            myOverlap.remove(myinterval)
-                            myOverlap.append((myinterval[0], intervalStart, myinterval[2], myinterval[3], myinterval[4], myinterval[5]))
-                            myOverlap.append((intervalStart, myinterval[1], myinterval[2] + interval[2], myinterval[3], myinterval[4], myinterval[5]))
-
-                        # Otherwise, check if my interval ends after this new one
-                        # (then, split on the end time)
-                        elif myinterval[1] >= intervalEnd:
-                            myOverlap.remove(myinterval)
-                            myOverlap.append((myinterval[0], intervalEnd, myinterval[2] + interval[2], myinterval[3], myinterval[4], myinterval[5]))
-                            myOverlap.append((intervalEnd, myinterval[1], myinterval[2], myinterval[3], myinterval[4], myinterval[5]))
-
-            for interval in myOverlap:
-                otherThreads = max(otherThreads, interval[2])
-
-            br = BlockSMRect(block, self.firstTime, self.totalTime, self.numSms,
-                             self.width, self.height, color, patternType, otherThreads)
-
-            br.draw(self.canvas)
-
-            if Y_VAL_SOURCE == "threads":
-                smBase[block.sm].append((block.start, block.end, block.numThreads, block.sm,
-                                         block.kernelName, block.id))
-            elif Y_VAL_SOURCE == "sharedmem":
-                smBase[block.sm].append((block.start, block.end, block.sharedMemCount, block.sm,
-                                         block.kernelName, block.id))
-            else:
-                pass # invalid!
+    def draw_raster(self, visible, colors, patternTypes):
+        # Let go of the image drawn before the window was resized
+        if self.raster != None:
+            self.raster.undraw()
+            self.raster = None
+        if min(self.get_plot_size()) <= 0: return
+        self.raster = BlockSMRaster(self.benchmark, visible, colors, patternTypes, self.firstTime, self.totalTime,
+                                    self.numSms, self.width, self.height, self.get_rgb)
+        self.raster.draw(self.canvas)
+
+    def get_rgb(self, color):
+        # Tk gives 16-bit intensities
+        return [value >> 8 for value in self.canvas.canvas.winfo_rgb(color)]
+
+    def draw_occupancy_summary(self, batch, colors):
+        if min(self.get_plot_size()) <= 0: return
+        # Summarize the usage the first time it's needed
+        if self.summary == None:
+            self.summary = OccupancySummary(self.benchmark, self.numSms, self.fullFirstTime,
+                                            self.fullFirstTime + self.fullTotalTime)
+        areas = OccupancyAreas(self.summary, colors, self.firstTime, self.totalTime,
+                               self.numSms, self.width, self.height)
+        areas.draw(batch)
+
+    def draw_occupancy_bars(self, batch, visible, colors):
+        if LOD_MIN_BLOCK_WIDTH <= 0: return
+        bars = OccupancyBars(self.benchmark, visible, colors, self.firstTime, self.totalTime,
+                             self.numSms, self.width, self.height)
+        bars.draw(batch)
+
+    def draw_stream(self, batch, stream, blockIdxs, color, patternType, i, releaseDict):
+        # Draw each kernel in the stream with blocks in view
+        kernelIdxs = numpy.searchsorted(stream.log.block_offsets, blockIdxs, "right") - 1
+        kernels, firstBlocks = numpy.unique(kernelIdxs, return_index=True)
+        kernelBlocks = numpy.split(blockIdxs, firstBlocks[1:])
+        for j in range(len(kernels)):
+            kernelBlocksIdxs = kernelBlocks[j] - stream.log.block_offsets[kernels[j]]
+            self.draw_kernel(batch, stream.kernels[kernels[j]], kernelBlocksIdxs, color, patternType, i, releaseDict)
+
+    def draw_kernel(self, batch, kernel, kernelBlocksIdxs, color, patternType, i, releaseDict):
+        if LOD_MIN_BLOCK_WIDTH > 0:
+            # Narrow blocks are drawn as part of the occupancy bars
+            p1x = get_x_pixels(kernel.blockStarts[kernelBlocksIdxs], self.firstTime, self.totalTime, self.width)
+            p2x = get_x_pixels(kernel.blockEnds[kernelBlocksIdxs], self.firstTime, self.totalTime, self.width)
+            kernelBlocksIdxs = kernelBlocksIdxs[(p2x - p1x) >= LOD_MIN_BLOCK_WIDTH]
+
+        # Draw the blocks of the kernel together
+        brs = BlockSMRects(kernel, kernelBlocksIdxs, self.firstTime, self.totalTime, self.numSms,
+                           self.width, self.height, color, patternType)
+        brs.draw(batch)
 
         # Draw a marker for the kernel release time
 ##        releaseIdx = releaseDict.get(kernel.releaseTime, 0)
@@ -775,28 +1238,244 @@ class BlockSMDisplay():
         yaxis = YAxis(self.numSms, self.firstTime, self.totalTime, self.width, self.height)
         yaxis.draw(self.canvas)
 
+###################################################
+# Export                                          #
+###################################################
+
+# The size of saved plots, in pixels, and their resolution
+EXPORT_WIDTH = 1600
+EXPORT_HEIGHT = 1200
+EXPORT_DPI = 100
+
+# The RGB values of the Tk colors used above, for drawing without Tk
+tkColorToHexMap = {"light pink": "#ffb6c1",
+                   "light blue": "#add8e6",
+                   "LightGoldenrod2": "#eedc82",
+                   "light sea green": "#20b2aa",
+                   "MediumPurple1": "#ab82ff",
+                   "gray68": "#adadad",
+                   "orange": "#ffa500",
+                   "gray32": "#525252",
+                   "turquoise3": "#00c5cd",
+                   "lavender blush": "#fff0f5",
+                   "azure": "#f0ffff",
+                   "light yellow": "#ffffe0",
+                   "DarkSeaGreen1": "#c1ffc1",
+                   "lavender": "#e6e6fa",
+                   "light gray": "#d3d3d3",
+                   "navajo white": "#ffdead",
+                   "gray48": "#7a7a7a",
+                   "IndianRed3": "#cd5555",
+                   "SteelBlue2": "#5cacee",
+                   "LightGoldenrod3": "#cdbe70",
+                   "SpringGreen4": "#008b45",
+                   "dark orange": "#ff8c00",
+                   "turquoise1": "#00f5ff"}
+
+def get_rectangles_path(lefts, bottoms, rights, tops):
+    """Returns a single matplotlib Path made of every given rectangle."""
+    vertices = numpy.empty((len(lefts), 5, 2), dtype=numpy.float64)
+    vertices[:, 0, 0] = lefts
+    vertices[:, 0, 1] = bottoms
+    vertices[:, 1, 0] = rights
+    vertices[:, 1, 1] = bottoms
+    vertices[:, 2, 0] = rights
+    vertices[:, 2, 1] = tops
+    vertices[:, 3, 0] = lefts
+    vertices[:, 3, 1] = tops
+    vertices[:, 4] = vertices[:, 0]
+    Path = matplotlib.path.Path
+    codes = numpy.tile(numpy.array([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY],
+                                   dtype=Path.code_type), len(lefts))
+    return Path(vertices.reshape((-1, 2)), codes)
+
+def export_scenario(benchmarks, name, filenames):
+    """Takes a list of BenchmarkLogs, a scenario name and a list of filenames,
+    and saves the plot shown by BlockSMDisplay to each file, in the format
+    given by its extension. matplotlib is used instead of Tk, so no display is
+    needed. Each stream's blocks are drawn as one compound path, with the
+    stream's pattern as a hatch. Blocks are drawn at least one pixel wide,
+    only blocks at least LOD_MIN_BLOCK_WIDTH pixels wide are outlined, and
+    blocks aren't labelled."""
+    benchmark = get_block_intervals(name, benchmarks)
+    if len(benchmark.streams) == 0: return
+    numSms = benchmark.streams[0].maxResidentThreads / SM_THREADS
+    firstTime = 0.0
+    totalTime = (benchmark.get_end() - firstTime) * 1.05
+
+    figure = Figure(figsize=(EXPORT_WIDTH / float(EXPORT_DPI), EXPORT_HEIGHT / float(EXPORT_DPI)),
+                    dpi=EXPORT_DPI)
+    FigureCanvasAgg(figure)
+    figure.suptitle(name, y=1.0 - 16.0 / EXPORT_HEIGHT, verticalalignment="center", fontsize=14,
+                    fontweight="bold" if USE_BOLD_FONT else "normal")
+    # Leave the same margins as the Tk plot, with room for the legend on top
+    legendHeight = (len(benchmark.streams) + 1) / 2 * LEGEND_HEIGHT_BASE
+    plotTop = BUFFER_TOP + legendHeight + BUFFER_LEGEND
+    axes = figure.add_axes([float(BUFFER_LEFT) / EXPORT_WIDTH, float(BUFFER_BOTTOM) / EXPORT_HEIGHT,
+                            float(EXPORT_WIDTH - BUFFER_LEFT - BUFFER_RIGHT) / EXPORT_WIDTH,
+                            float(EXPORT_HEIGHT - plotTop - BUFFER_BOTTOM) / EXPORT_HEIGHT])
+    axes.set_xlim(firstTime, firstTime + totalTime)
+    axes.set_ylim(0, numSms)
+    pixelTime = totalTime / (EXPORT_WIDTH - BUFFER_LEFT - BUFFER_RIGHT)
+
+    handles = []
+    for i in range(len(benchmark.streams)):
+        stream = benchmark.streams[i]
+        log = stream.log
+        if USE_PATTERNS:
+            color = tkColorToHexMap[idToColorMap[i]]
+            fill = tkColorToHexMap[patternColorToBgColorMap[idToColorMap[i]]]
+            hatch = idToPatternMap[i].HATCH
+        else:
+            color = tkColorToHexMap[patternColorToArrowColorMap[idToColorMap[i]]]
+            fill = color
+            hatch = None
+        handles.append(matplotlib.patches.Patch(facecolor=fill, edgecolor=color, hatch=hatch,
+                                                label="Stream %d (%s)" % (i + 1, stream.label)))
+        if log.block_count() == 0: continue
+
+        # One row per SM, with blocks stacked as in the Tk plot
+        bottoms = log.block_smid + stream.blockBases / MAX_YVAL
+        tops = bottoms + stream.get_block_yvals() / MAX_YVAL
+        lefts = log.block_start
+        rights = numpy.maximum(log.block_end, lefts + pixelTime)
+        path = get_rectangles_path(lefts, bottoms, rights, tops)
+        # The hatch is drawn in the edge color, so the outlines are separate
+        axes.add_patch(matplotlib.patches.PathPatch(path, facecolor=fill, edgecolor=color, hatch=hatch,
+                                                    linewidth=0))
+        outlined = (log.block_end - lefts) >= LOD_MIN_BLOCK_WIDTH * pixelTime
+        if outlined.any():
+            path = get_rectangles_path(lefts[outlined], bottoms[outlined], rights[outlined], tops[outlined])
+            axes.add_patch(matplotlib.patches.PathPatch(path, facecolor="none", edgecolor="black",
+                                                        linewidth=1))
+
+    # One grid line between each SM, and one label in the middle of each
+    axes.hlines(numpy.arange(1, numSms), firstTime, firstTime + totalTime, colors="black",
+                linewidth=1)
+    axes.set_yticks(numpy.arange(numSms) + 0.5)
+    axes.set_yticklabels(["SM %d" % i for i in range(numSms)])
+    tickTime = get_tick_time(totalTime)
+    axes.set_xticks(numpy.arange(1, int(math.ceil(totalTime / tickTime))) * tickTime)
+    axes.set_xlabel("Time (seconds)")
+    axes.legend(handles=handles, loc="lower left", ncol=2, mode="expand", borderaxespad=0.5,
+                bbox_to_anchor=(0.0, 1.0, 1.0, float(legendHeight) / (EXPORT_HEIGHT - plotTop - BUFFER_BOTTOM)))
+    for filename in filenames:
+        figure.savefig(filename)
+
 ###################################################
 # Data                                            #
 ###################################################
 
-class Block(object):
-    def __init__(self, startTime, endTime, numThreads, smId, threadId, blockId, kernel):
-        self.start = startTime
-        self.end = endTime
-        self.numThreads = numThreads
-        self.sm = smId
-        self.thread = threadId
-        self.id = blockId
-        self.kernelName = kernel.kernelName
-        self.sharedMemCount = kernel.sharedMemCount
-        self.kernel = kernel
+class RangeMaxTree(object):
+    """A segment tree over a fixed number of slots, all initially 0, which
+    supports adding a value to a range of slots and finding the largest value
+    in a range of slots. Both operations take O(log n) time. Ranges include
+    the first index but not the last."""
+    def __init__(self, size):
+        # Round the size up to a power of two so the tree is complete.
+        self.size = 1
+        self.height = 0
+        while self.size < size:
+            self.size *= 2
+            self.height += 1
+        self.maxValues = [0] * (2 * self.size)
+        self.pendingAdds = [0] * self.size
+
+    def apply(self, node, value):
+        self.maxValues[node] += value
+        if node < self.size:
+            self.pendingAdds[node] += value
+
+    def rebuild(self, node):
+        # Recompute the maximum of every ancestor of the node
+        while node > 1:
+            node >>= 1
+            self.maxValues[node] = max(self.maxValues[2 * node],
+                                       self.maxValues[2 * node + 1]) + self.pendingAdds[node]
+
+    def push(self, node):
+        # Move additions still pending in the node's ancestors down to it
+        for shift in range(self.height, 0, -1):
+            i = node >> shift
+            if self.pendingAdds[i] != 0:
+                self.apply(2 * i, self.pendingAdds[i])
+                self.apply(2 * i + 1, self.pendingAdds[i])
+                self.pendingAdds[i] = 0
+
+    def add(self, start, end, value):
+        if start >= end: return
+        start += self.size
+        end += self.size
+        firstNode = start
+        lastNode = end - 1
+        while start < end:
+            if start & 1:
+                self.apply(start, value)
+                start += 1
+            if end & 1:
+                end -= 1
+                self.apply(end, value)
+            start >>= 1
+            end >>= 1
+        self.rebuild(firstNode)
+        self.rebuild(lastNode)
+
+    def get_max(self, start, end):
+        if start >= end: return 0
+        start += self.size
+        end += self.size
+        self.push(start)
+        self.push(end - 1)
+        result = 0
+        while start < end:
+            if start & 1:
+                result = max(result, self.maxValues[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                result = max(result, self.maxValues[end])
+            start >>= 1
+            end >>= 1
+        return result
+
+# The most (block, time slice) pairs on one SM for which get_stacked_bases is
+# used. Above this, the blocks overlap so much that a RangeMaxTree sweep uses
+# less memory.
+MAX_SLICE_PAIRS = 4000000
+
+def get_stacked_bases(firstSlices, lastSlices, values):
+    """Takes the range of time slices covered by each block on an SM, in
+    drawing order, and each block's usage. Returns the same bases as sweeping
+    the blocks with a RangeMaxTree: the most usage by earlier blocks in any
+    slice covered by each block. Every (block, slice) pair is listed, so this
+    only suits blocks which each cover a few slices."""
+    spans = lastSlices - firstSlices
+    pairStarts = numpy.cumsum(spans) - spans
+    owners = numpy.repeat(numpy.arange(len(spans)), spans)
+    slices = numpy.repeat(firstSlices, spans) + numpy.arange(len(owners)) - \
+        numpy.repeat(pairStarts, spans)
+    # Within each slice, total the usage of the blocks drawn before each one
+    order = numpy.lexsort((owners, slices))
+    usage = numpy.asarray(values, dtype=numpy.int64)[owners[order]]
+    totals = numpy.cumsum(usage) - usage
+    newSlice = numpy.ones(len(order), dtype=bool)
+    newSlice[1:] = slices[order][1:] != slices[order][:-1]
+    totals -= numpy.maximum.accumulate(numpy.where(newSlice, totals, 0))
+    # Pairs are listed by block, so each block's pairs are contiguous
+    pairTotals = numpy.zeros(len(order), dtype=numpy.int64)
+    pairTotals[order] = totals
+    bases = numpy.zeros(len(spans), dtype=numpy.int64)
+    covering = spans > 0
+    if covering.any():
+        bases[covering] = numpy.maximum.reduceat(pairTotals, pairStarts[covering])
+    return bases
 
 class Kernel(object):
-    def __init__(self, stream, kernelInfoDict):
-        self.parse_kernel(stream, kernelInfoDict)
+    def __init__(self, stream, kernelIdx):
+        self.parse_kernel(stream, kernelIdx)
 
-    def parse_kernel(self, stream, kernelInfoDict):
-        self.blocks = []
+    def parse_kernel(self, stream, kernelIdx):
+        log = stream.log
 
         self.scenarioName = stream.scenarioName
         self.label = stream.label
@@ -804,76 +1483,72 @@ class Kernel(object):
         self.releaseTime = stream.releaseTime
         self.maxResidentThreads = stream.maxResidentThreads
 
-        self.kernelName = kernelInfoDict["kernel_name"]
-        self.kernelStart = kernelInfoDict["kernel_times"][0]
-        self.kernelEnd = kernelInfoDict["kernel_times"][1]
-
-        self.blockCount = kernelInfoDict["block_count"]
-        self.threadCount = kernelInfoDict["thread_count"]
-        self.sharedMemCount = kernelInfoDict["shared_memory"] # int, in bytes
-
-        self.blockStarts = []
-        self.blockEnds = []
-        self.blockSms = []
-        for i in range(self.blockCount):
-            self.blockStarts.append(kernelInfoDict["block_times"][i*2])
-            self.blockEnds.append(kernelInfoDict["block_times"][i*2+1])
-            self.blockSms.append(kernelInfoDict["block_smids"][i])
-            block = Block(self.blockStarts[-1], self.blockEnds[-1], self.threadCount,
-                          self.blockSms[-1], self.tid, i, self)
-            self.blocks.append(block)
+        self.kernelName = log.get_kernel_name(kernelIdx)
+        self.kernelStart = log.kernel_start[kernelIdx]
+        self.kernelEnd = log.kernel_end[kernelIdx]
 
-    def get_start(self):
-        start = None
-        for block in self.blocks:
-            if start == None or block.start < start:
-                start = block.start
+        blocks = log.get_kernel_blocks(kernelIdx)
+        self.blockCount = blocks.stop - blocks.start
+        self.threadCount = int(log.thread_count[kernelIdx])
+        self.sharedMemCount = int(log.shared_memory[kernelIdx]) # int, in bytes
 
-        return start
+        # These are views into the stream's block arrays, not copies
+        self.blockStarts = log.block_start[blocks]
+        self.blockEnds = log.block_end[blocks]
+        self.blockSms = log.block_smid[blocks]
+        self.blockBases = stream.blockBases[blocks]
 
-    def get_end(self):
-        end = None
-        for block in self.blocks:
-            if end == None or block.end > end:
-                end = block.end
+    def get_yval(self):
+        # Every block in a kernel uses the same amount of each resource
+        if Y_VAL_SOURCE == "threads":
+            return self.threadCount
+        elif Y_VAL_SOURCE == "sharedmem":
+            return self.sharedMemCount
+        return 0 # invalid!
+
+    def get_start(self):
+        if self.blockCount == 0: return None
+        return self.blockStarts.min()
 
-        return end
+    def get_end(self):
+        if self.blockCount == 0: return None
+        return self.blockEnds.max()
 
 class Stream(object):
     def __init__(self, benchmark):
         self.parse_benchmark(benchmark)
 
     def parse_benchmark(self, benchmark):
-        self.blocks = []
+        self.log = benchmark
+
+        self.scenarioName = benchmark.scenario_name
+        self.label = benchmark.label if benchmark.label is not None else "" # string
+        self.tid = benchmark.tid # string
+        self.releaseTime = benchmark.release_time # float
+        self.maxResidentThreads = benchmark.max_resident_threads # int
 
-        self.scenarioName = benchmark["scenario_name"]
-        self.label = benchmark.get("label", "") # string
-        self.tid = benchmark["TID"] # string
-        self.releaseTime = benchmark["release_time"] # float
-        self.maxResidentThreads = benchmark["max_resident_threads"] # int
+        # The height at which each block is stacked, in Y_VAL_SOURCE units.
+        # Filled in once every stream in the scenario has been parsed.
+        self.blockBases = numpy.zeros(benchmark.block_count(), dtype=numpy.int64)
 
-        times = benchmark["times"][1:]
         self.kernels = []
-        for time in times:
-            if "cpu_times" in time:
-                continue
-            self.kernels.append(Kernel(self, time))
+        for i in range(benchmark.kernel_count()):
+            self.kernels.append(Kernel(self, i))
 
-    def get_start(self):
-        start = None
-        for kernel in self.kernels:
-            if start == None or kernel.get_start() < start:
-                start = kernel.get_start()
+    def get_block_yvals(self):
+        if Y_VAL_SOURCE == "threads":
+            return self.log.get_block_thread_counts()
+        elif Y_VAL_SOURCE == "sharedmem":
+            return self.log.get_block_shared_memory()
+        return numpy.zeros(self.log.block_count(), dtype=numpy.int32) # invalid!
 
-        return start
+    def get_start(self):
+        if self.log.block_count() == 0: return None
+        return self.log.block_start.min()
 
     def get_end(self):
-        end = None
-        for kernel in self.kernels:
-            if end == None or kernel.get_end() > end:
-                end = kernel.get_end()
-
-        return end
+        if self.log.block_count() == 0: return None
+        return self.log.block_end.max()
 
 class Benchmark(object):
     def __init__(self, name, benchmarks):
@@ -884,6 +1559,47 @@ class Benchmark(object):
         self.streams = []
         for benchmark in benchmarks:
             self.streams.append(Stream(benchmark))
+        self.compute_block_bases()
+
+    def compute_block_bases(self):
+        # Blocks are stacked in drawing order: each block sits on top of the
+        # most threads (or shared memory) used at any one time during its
+        # execution by blocks drawn before it on the same SM. Usually each
+        # block covers few time slices, so every (block, slice) pair can be
+        # listed at once. Otherwise, sweep the SM's blocks in drawing order,
+        # tracking the running usage per time slice.
+        if len(self.streams) == 0: return
+        starts = numpy.concatenate([s.log.block_start for s in self.streams])
+        ends = numpy.concatenate([s.log.block_end for s in self.streams])
+        sms = numpy.concatenate([s.log.block_smid for s in self.streams])
+        yvals = numpy.concatenate([s.get_block_yvals() for s in self.streams])
+        bases = numpy.zeros(len(starts), dtype=numpy.int64)
+        # A stable sort groups the blocks by SM but keeps the drawing order
+        order = numpy.argsort(sms, kind="mergesort")
+        smStarts = numpy.searchsorted(sms[order], numpy.unique(sms))
+        for idxs in numpy.split(order, smStarts[1:]):
+            # Slice time at every block start and end on this SM
+            times = numpy.unique(numpy.concatenate((starts[idxs], ends[idxs])))
+            firstSlices = numpy.searchsorted(times, starts[idxs])
+            lastSlices = numpy.searchsorted(times, ends[idxs])
+            if (lastSlices - firstSlices).sum() <= MAX_SLICE_PAIRS:
+                bases[idxs] = get_stacked_bases(firstSlices, lastSlices, yvals[idxs])
+                continue
+            firstSlices = firstSlices.tolist()
+            lastSlices = lastSlices.tolist()
+            values = yvals[idxs].tolist()
+            smBases = []
+            usage = RangeMaxTree(len(times))
+            for j in range(len(values)):
+                smBases.append(usage.get_max(firstSlices[j], lastSlices[j]))
+                usage.add(firstSlices[j], lastSlices[j], values[j])
+            bases[idxs] = smBases
+        # Hand each stream its own part of the results
+        offset = 0
+        for stream in self.streams:
+            count = len(stream.blockBases)
+            stream.blockBases[:] = bases[offset:offset + count]
+            offset += count
 
     def get_start(self):
         return min([s.get_start() for s in self.streams])
@@ -891,45 +1607,153 @@ class Benchmark(object):
     def get_end(self):
         return max([s.get_end() for s in self.streams])
 
+class BlockTimeIndex(object):
+    """The blocks of every stream, split by SM and sorted by start time, so
+    that the blocks running during a window of time can be found with binary
+    searches. For each block, the latest end time of the blocks up to it on
+    its SM is kept too. These never decrease, so they can be searched for the
+    first block which may still be running at a given time."""
+    def __init__(self, benchmark, numSms):
+        self.numStreams = len(benchmark.streams)
+        starts = numpy.concatenate([s.log.block_start for s in benchmark.streams])
+        ends = numpy.concatenate([s.log.block_end for s in benchmark.streams])
+        sms = numpy.concatenate([s.log.block_smid for s in benchmark.streams])
+        streamIdxs = numpy.concatenate([numpy.full(s.log.block_count(), i, dtype=numpy.int32)
+                                        for i, s in enumerate(benchmark.streams)])
+        blockIdxs = numpy.concatenate([numpy.arange(s.log.block_count()) for s in benchmark.streams])
+        order = numpy.lexsort((starts, sms))
+        smStarts = numpy.searchsorted(sms[order], numpy.arange(numSms + 1))
+        self.starts = []
+        self.ends = []
+        self.latestEnds = []
+        self.streamIdxs = []
+        self.blockIdxs = []
+        for sm in range(numSms):
+            idxs = order[smStarts[sm]:smStarts[sm + 1]]
+            self.starts.append(starts[idxs])
+            self.ends.append(ends[idxs])
+            self.latestEnds.append(numpy.maximum.accumulate(ends[idxs]))
+            self.streamIdxs.append(streamIdxs[idxs])
+            self.blockIdxs.append(blockIdxs[idxs])
+
+    def get_ranges(self, startTime, endTime):
+        # On each SM, the blocks from the first which may still be running at
+        # startTime up to the last which starts by endTime
+        ranges = []
+        for sm in range(len(self.starts)):
+            first = numpy.searchsorted(self.latestEnds[sm], startTime, "left")
+            last = numpy.searchsorted(self.starts[sm], endTime, "right")
+            ranges.append((first, max(first, last)))
+        return ranges
+
+    def count_visible(self, startTime, endTime):
+        """Returns at least the number of blocks running at any time from
+        startTime to endTime, without finding them."""
+        return sum([last - first for first, last in self.get_ranges(startTime, endTime)])
+
+    def get_visible(self, startTime, endTime):
+        """Returns a sorted array for each stream, holding the indices of its
+        blocks running at any time from startTime to endTime."""
+        streamIdxs = [numpy.zeros(0, dtype=numpy.int32)]
+        blockIdxs = [numpy.zeros(0, dtype=numpy.int64)]
+        ranges = self.get_ranges(startTime, endTime)
+        for sm in range(len(ranges)):
+            first, last = ranges[sm]
+            running = self.ends[sm][first:last] >= startTime
+            streamIdxs.append(self.streamIdxs[sm][first:last][running])
+            blockIdxs.append(self.blockIdxs[sm][first:last][running])
+        streamIdxs = numpy.concatenate(streamIdxs)
+        blockIdxs = numpy.concatenate(blockIdxs)
+        return [numpy.sort(blockIdxs[streamIdxs == i]) for i in range(self.numStreams)]
+
+def get_ramp_sums(points, weights, times):
+    """Returns, for each time, the sum of weight * (time - point) over the
+    points before the time."""
+    order = numpy.argsort(points)
+    points = points[order]
+    weights = weights[order]
+    counts = numpy.searchsorted(points, times)
+    weightSums = numpy.concatenate(([0.0], numpy.cumsum(weights)))
+    momentSums = numpy.concatenate(([0.0], numpy.cumsum(weights * points)))
+    return times * weightSums[counts] - momentSums[counts]
+
+class OccupancySummary(object):
+    """The usage of each SM by each stream, in Y_VAL_SOURCE units, integrated
+    over time from startTime up to the end of each of OCCUPANCY_SLICES equal
+    slices of time ending at endTime. Between the ends of the slices, the
+    integral is interpolated linearly. The average usage during any window
+    of time, at any zoom level, is then the difference between the integral
+    at the window's ends, divided by its length."""
+    def __init__(self, benchmark, numSms, startTime, endTime):
+        self.startTime = startTime
+        self.sliceTime = max(endTime - startTime, MIN_VIEW_TIME) / OCCUPANCY_SLICES
+        times = numpy.arange(OCCUPANCY_SLICES + 1) * self.sliceTime
+        self.integrals = numpy.zeros((len(benchmark.streams), numSms, len(times)))
+        for i in range(len(benchmark.streams)):
+            stream = benchmark.streams[i]
+            log = stream.log
+            yvals = stream.get_block_yvals().astype(numpy.float64)
+            order = numpy.argsort(log.block_smid, kind="mergesort")
+            smStarts = numpy.searchsorted(log.block_smid[order], numpy.arange(numSms + 1))
+            for sm in range(numSms):
+                idxs = order[smStarts[sm]:smStarts[sm + 1]]
+                # Each block adds its usage for the time since it started,
+                # minus the time since it ended
+                starts = log.block_start[idxs] - startTime
+                ends = log.block_end[idxs] - startTime
+                self.integrals[i, sm] = get_ramp_sums(starts, yvals[idxs], times) - \
+                    get_ramp_sums(ends, yvals[idxs], times)
+
+    def get_usage(self, times):
+        """Takes an array of increasing times, and returns the average usage of
+        each SM by each stream between each pair of consecutive times, in an
+        array of shape (streams, SMs, len(times) - 1)."""
+        positions = numpy.clip((times - self.startTime) / self.sliceTime, 0, OCCUPANCY_SLICES)
+        slices = numpy.minimum(positions.astype(numpy.int64), OCCUPANCY_SLICES - 1)
+        fractions = positions - slices
+        integrals = self.integrals[:, :, slices] * (1.0 - fractions) + self.integrals[:, :, slices + 1] * fractions
+        return numpy.diff(integrals, axis=2) / numpy.diff(times)
+
 def get_block_intervals(name, benchmarks):
     return Benchmark(name, benchmarks)
 
 def plot_scenario(benchmarks, name):
-    """Takes a list of parsed benchmark results and a scenario name and
-    generates a plot showing the timeline of benchmark behaviors for the
-    specific scenario."""
+    """Takes a list of BenchmarkLogs and a scenario name and generates a plot
+    showing the timeline of benchmark behaviors for the specific scenario."""
     win = Window("Block Execution by SM")
     graph = BlockSMDisplay(win, get_block_intervals(name, benchmarks))
     win.mainloop()
     
-def show_plots(filenames):
-    """Takes a list of filenames, and generates one plot per scenario found in
-    the files."""
-    # Parse the files
-    parsed_files = []
-    for name in filenames:
-        with open(name) as f:
-            parsed_files.append(json.loads(f.read()))
-            
+def show_plots(benchmarks):
+    """Takes a list of BenchmarkLogs, and generates one plot per scenario found
+    in them."""
     # Group the files by scenario
-    scenarios = {}
-    for benchmark in parsed_files:
-        scenario = benchmark["scenario_name"]
-        if not scenario in scenarios:
-            scenarios[scenario] = []
-        scenarios[scenario].append(benchmark)
+    scenarios = benchmark_log.group_by_scenario(benchmarks)
 
     # Plot the scenarios
     for scenario in scenarios:
         plot_scenario(scenarios[scenario], scenario)
 
 if __name__ == "__main__":
-    base_directory = "./results"
-    if len(sys.argv) > 2:
-        print "Usage: python %s [directory containing results (./results)]" % (
-            sys.argv[0])
-        exit(1)
-    if len(sys.argv) == 2:
-        base_directory = sys.argv[1]
-    filenames = glob.glob(base_directory + "/*.json")
-    show_plots(filenames)
+    parser = viewer_options.get_argument_parser("Shows the blocks run on each "
+        "SM by each benchmark.")
+    parser.add_argument("--lod-threshold", type=int, default=LOD_MIN_BLOCK_WIDTH,
+        help="Blocks narrower than this many pixels are combined into " +
+        "occupancy bars. 0 draws every block. Default: %d" % LOD_MIN_BLOCK_WIDTH)
+    parser.add_argument("--resource", default=Y_VAL_SOURCE,
+        choices=sorted(benchmark_log.SM_CAPACITY.keys()),
+        help="The resource whose use sets the height of each block. " +
+        "Default: %s" % Y_VAL_SOURCE)
+    parser.add_argument("--raster", action="store_true",
+        help="Draw the blocks into a single image, which is faster for " +
+        "scenarios with many blocks. Blocks aren't labelled.")
+    viewer_options.add_output_arguments(parser, ["png", "svg"])
+    args = parser.parse_args()
+    LOD_MIN_BLOCK_WIDTH = args.lod_threshold
+    USE_RASTER = args.raster
+    Y_VAL_SOURCE = args.resource
+    MAX_YVAL = float(benchmark_log.SM_CAPACITY[Y_VAL_SOURCE])
+    if args.output_dir is None:
+        show_plots(viewer_options.load_benchmarks(args))
+    else:
+        viewer_options.export_scenarios(args, export_scenario)
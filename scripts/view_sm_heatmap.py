@@ -0,0 +1,148 @@
+# This script reads all JSON result files and uses matplotlib to display a
+# heatmap of how much of each SM's threads or shared memory were in use over
+# time, by all of a scenario's benchmarks together. Rather than drawing each
+# block, the occupancy is summed into a grid of bins, one row per SM and one
+# column per slice of time, and drawn as a single image, so even hour-long
+# runs are quick to draw. For this to work, all result filenames must end in
+# .json.
+#
+# Usage: python view_sm_heatmap.py [options] [results directory]
+#
+# The results directory defaults to ./results. Run with --help to list the
+# options.
+import benchmark_log
+import matplotlib.pyplot as plot
+import matplotlib.ticker
+import numpy
+import viewer_options
+
+# The resource whose occupancy is shown: a key of benchmark_log.SM_CAPACITY.
+# Set with --resource.
+RESOURCE = "threads"
+
+# The number of columns of bins the time is divided into. Set with --bins.
+BIN_COUNT = 2000
+
+# The colorbar labels for each resource.
+RESOURCE_LABELS = {
+    "threads": "Fraction of the SM's threads in use",
+    "sharedmem": "Fraction of the SM's shared memory in use",
+}
+
+def get_occupancy_bins(starts, ends, sms, usage, sm_count, start_time,
+    end_time, bin_count):
+    """Takes arrays holding the start and end times, SM and resource usage of
+    every block, and returns an array of shape (sm_count, bin_count) holding
+    the average usage of each SM during each of bin_count equal bins of time
+    from start_time to end_time. Each block adds its usage, weighted by the
+    fraction of the bin it covers, to the first and last bins it overlaps,
+    and its full usage to the bins in between. The bins in between are
+    filled by adding to and subtracting from the bins at either end of them,
+    and taking a cumulative sum."""
+    width = (end_time - start_time) / float(bin_count)
+    # Times are measured in bins from here on.
+    starts = (numpy.clip(starts, start_time, end_time) - start_time) / width
+    ends = (numpy.clip(ends, start_time, end_time) - start_time) / width
+    keep = (ends > starts) & (sms < sm_count)
+    starts = starts[keep]
+    ends = ends[keep]
+    usage = usage[keep].astype(numpy.float64)
+    firsts = numpy.minimum(starts.astype(numpy.int64), bin_count - 1)
+    lasts = numpy.minimum(ends.astype(numpy.int64), bin_count - 1)
+    # Each SM's row has an extra bin, for the ends of blocks in its last bin.
+    rows = sms[keep].astype(numpy.int64) * (bin_count + 1)
+    size = sm_count * (bin_count + 1)
+    spans = lasts > firsts
+    partial = numpy.bincount(numpy.concatenate((rows + firsts,
+        rows[spans] + lasts[spans])), weights=numpy.concatenate((usage *
+        (numpy.minimum(ends, firsts + 1) - starts), usage[spans] *
+        (ends[spans] - lasts[spans]))), minlength=size)
+    deltas = numpy.bincount(numpy.concatenate((rows[spans] + firsts[spans] +
+        1, rows[spans] + lasts[spans])), weights=numpy.concatenate((
+        usage[spans], -usage[spans])), minlength=size)
+    bins = partial.reshape((sm_count, bin_count + 1)) + numpy.cumsum(
+        deltas.reshape((sm_count, bin_count + 1)), axis=1)
+    return bins[:, :bin_count]
+
+def get_scenario_occupancy(benchmarks, resource, bin_count):
+    """Takes a list of BenchmarkLogs from the same scenario, and returns a
+    tuple of the start and end times of the scenario's kernels, and an array
+    holding the fraction of the given resource in use on each SM (the rows)
+    during each of bin_count equal bins of that time (the columns)."""
+    benchmarks = [b for b in benchmarks if b.kernel_count() != 0]
+    if len(benchmarks) == 0:
+        return 0.0, 1.0, numpy.zeros((0, bin_count))
+    start_time = min(b.kernel_start.min() for b in benchmarks)
+    end_time = max(b.kernel_end.max() for b in benchmarks)
+    if end_time <= start_time:
+        end_time = start_time + 1.0
+    sm_count = benchmarks[0].max_resident_threads // \
+        benchmark_log.SM_THREADS
+    bins = get_occupancy_bins(
+        numpy.concatenate([b.block_start for b in benchmarks]),
+        numpy.concatenate([b.block_end for b in benchmarks]),
+        numpy.concatenate([b.block_smid for b in benchmarks]),
+        numpy.concatenate([b.get_block_usage(resource) for b in benchmarks]),
+        sm_count, start_time, end_time, bin_count)
+    return start_time, end_time, bins / benchmark_log.SM_CAPACITY[resource]
+
+def plot_scenario(benchmarks, name, resource, bin_count):
+    """Takes a list of parsed benchmark results and a scenario name, and
+    generates a heatmap of the occupancy of the given resource on each SM
+    over time."""
+    start_time, end_time, occupancy = get_scenario_occupancy(benchmarks,
+        resource, bin_count)
+    figure = plot.figure()
+    figure.suptitle(name)
+    axes = figure.add_subplot(1, 1, 1)
+    # Every bin is one pixel of the image, so there's just one thing to draw.
+    # Each SM's row is centered on its ID.
+    image = axes.imshow(occupancy, aspect="auto", origin="lower",
+        interpolation="nearest", extent=(start_time, end_time, -0.5,
+        len(occupancy) - 0.5), vmin=0.0, vmax=1.0, cmap="viridis")
+    axes.yaxis.set_major_locator(matplotlib.ticker.MaxNLocator(integer=True))
+    axes.set_xlabel("Time (seconds)")
+    axes.set_ylabel("SM")
+    colorbar = figure.colorbar(image)
+    colorbar.set_label(RESOURCE_LABELS[resource])
+    return figure
+
+def show_plots(benchmarks, resource, bin_count):
+    """Takes a list of BenchmarkLogs, and generates one heatmap per scenario
+    found in them."""
+    scenarios = benchmark_log.group_by_scenario(benchmarks)
+    figures = []
+    for scenario in scenarios:
+        figures.append(plot_scenario(scenarios[scenario], scenario, resource,
+            bin_count))
+    plot.show()
+
+def export_scenario(benchmarks, name, filenames):
+    """Takes a list of BenchmarkLogs, a scenario name and a list of filenames,
+    and saves the scenario's heatmap to each file, in the format given by its
+    extension. The resource and number of bins are taken from RESOURCE and
+    BIN_COUNT. The figure is closed once it has been saved."""
+    figure = plot_scenario(benchmarks, name, RESOURCE, BIN_COUNT)
+    for filename in filenames:
+        figure.savefig(filename)
+    plot.close(figure)
+
+if __name__ == "__main__":
+    parser = viewer_options.get_argument_parser("Shows a heatmap of the " +
+        "occupancy of each SM over time.")
+    parser.add_argument("--resource", default=RESOURCE,
+        choices=sorted(benchmark_log.SM_CAPACITY.keys()),
+        help="The resource whose occupancy is shown. Default: %s" % RESOURCE)
+    parser.add_argument("--bins", type=int, default=BIN_COUNT,
+        help="The number of columns the time is divided into. Default: %d" %
+        BIN_COUNT)
+    viewer_options.add_output_arguments(parser, ["png", "pdf", "svg"])
+    args = parser.parse_args()
+    RESOURCE = args.resource
+    BIN_COUNT = args.bins
+    if args.output_dir is None:
+        show_plots(viewer_options.load_benchmarks(args), RESOURCE, BIN_COUNT)
+    else:
+        # Draw without a window, and without keeping any figures open
+        plot.switch_backend("agg")
+        viewer_options.export_scenarios(args, export_scenario)
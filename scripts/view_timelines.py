@@ -2,75 +2,58 @@
 # timeline indicating when blocks and threads from multiple jobs were run on
 # GPU. For this to work, all result filenames must end in .json.
 #
-# Usage: python view_timeline.py [results directory (default: ./results)]
-import glob
-import json
+# Usage: python view_timeline.py [options] [results directory]
+#
+# The results directory defaults to ./results. Run with --help to list the
+# options.
+import benchmark_log
+import decimation
 import matplotlib.pyplot as plot
 import numpy
-import sys
-
-def get_kernel_timeline(kernel_times):
-    """Takes a single kernel invocation's information from the benchmark struct
-    and returns two lists. The first list contains times, and the second list
-    contains the number of threads running at each time."""
-    block_times = kernel_times["block_times"]
-    start_times = []
-    end_times = []
-    # Split block times into start and end times.
-    for i in range(len(block_times)):
-        if (i % 2) == 0:
-            start_times.append(block_times[i])
-        else:
-            end_times.append(block_times[i])
-    # Sort times in reverse order, so the earliest times will be popped first.
-    start_times.sort(reverse = True)
-    end_times.sort(reverse = True)
-    # Initialize the timeline to return so that 0 threads are running at time 0
-    timeline_times = []
-    timeline_values = []
-    timeline_times.append(0.0)
-    timeline_values.append(0)
-    # Next, iterate over start and end times and keep a running count of how
-    # many threads are running.
-    current_thread_count = 0
-    while True:
-        if (len(start_times) == 0) and (len(end_times) == 0):
-            break
-        if len(end_times) == 0:
-            print "Error! The last block end time was before a start time."
-            exit(1)
-        current_time = 0.0
-        previous_thread_count = current_thread_count
-        if len(start_times) != 0:
-            # Get the next closest time, be it a start or an end time. The <=
-            # is important, since we always want increment the block count
-            # before decrementing in the case when a block starts at the same
-            # time another ends.
-            if start_times[-1] == end_times[-1]:
-                # A block started and ended at the same time, don't change the
-                # current thread count.
-                current_time = start_times.pop()
-                end_times.pop()
-            if start_times[-1] <= end_times[-1]:
-                # A block started, so increase the thread count
-                current_time = start_times.pop()
-                current_thread_count += kernel_times["thread_count"]
-            else:
-                # A block ended, so decrease the thread count
-                current_time = end_times.pop()
-                current_thread_count -= kernel_times["thread_count"]
-        else:
-            # Only end times are left, so keep decrementing the block count.
-            current_time = end_times.pop()
-            current_thread_count -= kernel_times["thread_count"]
-        # Make sure that changes between numbers of running threads are abrupt.
-        # Do this by only changing the number of blocks at the instant they
-        # actually change rather than interpolating between two values.
-        timeline_times.append(current_time)
-        timeline_values.append(previous_thread_count)
-        # Finally, append the new thread count.
-        timeline_times.append(current_time)
-        timeline_values.append(current_thread_count)
+import viewer_options
+
+def get_kernel_timeline(benchmark, kernel_index):
+    """Takes a BenchmarkLog and the index of a single kernel invocation in it,
+    and returns two arrays. The first array contains times, and the second
+    array contains the number of threads running at each time."""
+    blocks = benchmark.get_kernel_blocks(kernel_index)
+    thread_count = benchmark.thread_count[kernel_index]
+    # Sort the block start and end times.
+    start_times = numpy.sort(benchmark.block_start[blocks])
+    end_times = numpy.sort(benchmark.block_end[blocks])
+    if (len(start_times) != 0) and (start_times[-1] > end_times[-1]):
+        print "Error! The last block end time was before a start time."
+        exit(1)
+    # Count the number of blocks starting and ending at each distinct time.
+    event_times = numpy.union1d(start_times, end_times)
+    start_counts = numpy.searchsorted(start_times, event_times, "right") - \
+        numpy.searchsorted(start_times, event_times, "left")
+    end_counts = numpy.searchsorted(end_times, event_times, "right") - \
+        numpy.searchsorted(end_times, event_times, "left")
+    # A block starting at the same time another ends doesn't change the thread
+    # count, so each such start and end pair becomes a single event with no
+    # change. Any starts or ends left over at the same time come afterwards.
+    paired_counts = numpy.minimum(start_counts, end_counts)
+    event_counts = numpy.maximum(start_counts, end_counts)
+    directions = numpy.sign(start_counts - end_counts)
+    times = numpy.repeat(event_times, event_counts)
+    group_starts = numpy.repeat(numpy.cumsum(event_counts) - event_counts,
+        event_counts)
+    group_offsets = numpy.arange(len(times)) - group_starts
+    deltas = numpy.where(group_offsets < numpy.repeat(paired_counts,
+        event_counts), 0, numpy.repeat(directions, event_counts))
+    deltas = (deltas * thread_count).astype(numpy.int32)
+    thread_counts = numpy.cumsum(deltas, dtype=numpy.int32)
+    # Make sure that changes between numbers of running threads are abrupt.
+    # Do this by only changing the number of blocks at the instant they
+    # actually change rather than interpolating between two values. The
+    # timeline also starts with 0 threads running at time 0.
+    timeline_times = numpy.zeros(len(times) * 2 + 1, dtype=numpy.float64)
+    timeline_values = numpy.zeros(len(times) * 2 + 1, dtype=numpy.int32)
+    timeline_times[1::2] = times
+    timeline_times[2::2] = times
+    timeline_values[1::2] = thread_counts - deltas
+    timeline_values[2::2] = thread_counts
     return [timeline_times, timeline_values]
 
 def merge_timelines(timeline_a, timeline_b):
@@ -79,145 +62,91 @@ def merge_timelines(timeline_a, timeline_b):
     of times and added values, so that if an interval in both timelines
     overlap, then the returned timeline will show the sum of the two values
     during that interval."""
-    combined_times = []
-    combined_values = []
-    # Reverse the timelines so that we pop the earliest values first.
-    times_a = timeline_a[0]
-    values_a = timeline_a[1]
-    times_b = timeline_b[0]
-    values_b = timeline_b[1]
-    times_a.reverse()
-    values_a.reverse()
-    times_b.reverse()
-    values_b.reverse()
-    # Track the a and b values independently
-    current_a_value = 0
-    current_b_value = 0
-
-    # Returns the next time from either timeline to appended to the output.
-    def get_next_smallest_time():
-        if (len(times_a) == 0) and (len(times_b) == 0):
-            raise Exception("Internal error combining timelines.")
-        if (len(times_a) == 0):
-            return times_b[-1]
-        if (len(times_b) == 0):
-            return times_a[-1]
-        if times_a[-1] <= times_b[-1]:
-            return times_a[-1]
-        return times_b[-1]
-
-    # Run the update_output() closure until all of the original timeline values
-    # have been combined into the output.
-    while (len(times_a) > 0) or (len(times_b) > 0):
-        t = get_next_smallest_time()
-        # It's possible that both timelines have a change in value at the same
-        # time.
-        if (len(times_a) != 0) and (times_a[-1] == t):
-            times_a.pop()
-            current_a_value = values_a.pop()
-        if (len(times_b) != 0) and (times_b[-1] == t):
-            times_b.pop()
-            current_b_value = values_b.pop()
-        combined_times.append(t)
-        combined_values.append(current_a_value + current_b_value)
-
-    return [combined_times, combined_values]
+    return merge_all_timelines([timeline_a, timeline_b])
+
+def merge_all_timelines(timelines):
+    """Takes a list of timelines, each containing a sorted list of times and a
+    list of values, and combines them into a single timeline in one pass. The
+    result is the same as repeatedly combining the timelines using
+    merge_timelines, but avoids rescanning the combined timeline for every
+    additional timeline. Returns a list containing an array of times and an
+    array of values."""
+    timelines = [t for t in timelines if len(t[0]) != 0]
+    if len(timelines) == 0:
+        return [numpy.zeros(0, dtype=numpy.float64),
+            numpy.zeros(0, dtype=numpy.int32)]
+    times = numpy.concatenate([numpy.asarray(t[0], dtype=numpy.float64)
+        for t in timelines])
+    values = numpy.concatenate([numpy.asarray(t[1], dtype=numpy.int64)
+        for t in timelines])
+    lengths = numpy.array([len(t[0]) for t in timelines])
+    first_indices = numpy.cumsum(lengths) - lengths
+    indices = numpy.arange(len(times))
+    # A timeline may change values several times at the same instant, so
+    # number each point among the points sharing its time in its own timeline.
+    # When timelines are combined, the n-th changes at a given time from each
+    # timeline happen together.
+    new_time = numpy.ones(len(times), dtype=bool)
+    new_time[1:] = times[1:] != times[:-1]
+    new_time[first_indices] = True
+    ranks = indices - numpy.maximum.accumulate(numpy.where(new_time, indices,
+        0))
+    # Each point changes the combined value by the difference between it and
+    # the previous point in its own timeline, which starts at 0.
+    deltas = values.copy()
+    deltas[1:] -= values[:-1]
+    deltas[first_indices] = values[first_indices]
+    # Sort the changes from every timeline together and keep a running total.
+    # Only the total after the last change with a given time and rank is kept.
+    order = numpy.lexsort((ranks, times))
+    times = times[order]
+    ranks = ranks[order]
+    totals = numpy.cumsum(deltas[order])
+    last_change = numpy.ones(len(times), dtype=bool)
+    last_change[:-1] = (times[1:] != times[:-1]) | (ranks[1:] != ranks[:-1])
+    return [times[last_change], totals[last_change].astype(numpy.int32)]
 
 def get_thread_timeline(benchmark):
-    """"Takes a parsed benchmark dict and returns timeline data consisting of
-    a list of two lists. The first list will contain times, and the second list
-    will contain the corresponding number of threads running at each time."""
-    # Remember, the first entry in the times array is an empty object.
-    all_kernels = benchmark["times"][1:]
-    to_return = [[], []]
+    """"Takes a BenchmarkLog and returns timeline data consisting of a list of
+    two arrays. The first array will contain times, and the second array will
+    contain the corresponding number of threads running at each time."""
+    kernel_timelines = []
+    for i in range(benchmark.kernel_count()):
+        kernel_timelines.append(get_kernel_timeline(benchmark, i))
     # Combine all kernels' timelines into a single timeline.
-    for k in all_kernels:
-        if "cpu_times" in k:
-            continue
-        kernel_timeline = get_kernel_timeline(k)
-        to_return = merge_timelines(to_return, kernel_timeline)
-    return to_return
+    return merge_all_timelines(kernel_timelines)
 
 def get_stackplot_values(benchmarks):
-    """Takes a list of benchmark results and returns a list of lists of data
-    that can be passed as arguments to stackplot (with a single list of
-    x-values followed by multiple lists of y-values)."""
+    """Takes a list of benchmark results and returns a list of data that can be
+    passed as arguments to stackplot: an array of x-values followed by a 2-D
+    array containing one row of y-values for each benchmark."""
     timelines = []
     for b in benchmarks:
         timelines.append(get_thread_timeline(b))
-    # Track indices into the list of times and values from each benchmark as
-    # we build an aggregate list.
-    times_lists = []
-    values_lists = []
-    indices = []
-    new_times = []
-    new_values = []
-
-    for t in timelines:
-        times_lists.append(t[0])
-        values_lists.append(t[1])
-        indices.append(0)
-        new_values.append([])
-
-    # Selects the next smallest time we need to add to our output list.
-    def current_min_time():
-        current_min = 1e99
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(times_lists[i]):
-                continue
-            if times_lists[i][n] < current_min:
-                current_min = times_lists[i][n]
-        return current_min
-
-    # Returns true if we've seen all the times in every list.
-    def all_times_done():
-        for i in range(len(indices)):
-            if indices[i] < len(times_lists[i]):
-                return False
-        return True
-
-    # Moves to the next time for each input list if the current time is at the
-    # head of the list.
-    def update_indices(current_time):
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(times_lists[i]):
-                continue
-            if times_lists[i][n] == current_time:
-                indices[i] += 1
-
-    def update_values():
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(values_lists[i]):
-                new_values[i].append(0)
-                continue
-            new_values[i].append(values_lists[i][n])
-
-    while not all_times_done():
-        current_time = current_min_time()
-        new_times.append(current_time)
-        update_values()
-        update_indices(current_time)
-
-    to_return = []
-    to_return.append(new_times)
-    for v in new_values:
-        to_return.append(v)
-    return to_return
+    # Every time at which any benchmark's thread count changes is on the grid.
+    all_times = numpy.unique(numpy.concatenate([t[0] for t in timelines]))
+    # Each time appears twice so that changes between numbers of running
+    # threads are abrupt: first with the values from just before the time, and
+    # then with the values after every change at the time.
+    new_times = numpy.repeat(all_times, 2)
+    new_values = numpy.zeros((len(timelines), len(new_times)),
+        dtype=numpy.int32)
+    for i in range(len(timelines)):
+        times = timelines[i][0]
+        # Prepend a 0 so that any time before a benchmark's first recorded
+        # time maps to 0 threads.
+        values = numpy.concatenate(([0], timelines[i][1]))
+        new_values[i, 0::2] = values[numpy.searchsorted(times, all_times,
+            "left")]
+        new_values[i, 1::2] = values[numpy.searchsorted(times, all_times,
+            "right")]
+    return [new_times, new_values]
 
 def get_total_timeline(benchmarks):
-    """Similar to get_stackplot_values, but only returns a single list of
+    """Similar to get_stackplot_values, but only returns a single array of
     values, containing the total number of threads from all benchmarks."""
     data = get_stackplot_values(benchmarks)
-    total_counts = []
-    for i in range(len(data[0])):
-        total_counts.append(0)
-    for i in range(len(data) - 1):
-        for j in range(len(data[i + 1])):
-            total_counts[j] += data[i + 1][j]
-    return [data[0], total_counts]
+    return [data[0], data[1].sum(axis=0)]
 
 def set_axes_dimensions(axes, min_x, max_x, min_y, max_y):
     """Sets the ticks and size for the given axes. Includes padding space so
@@ -245,9 +174,9 @@ def draw_release_arrow(axes, release_time):
 
 def benchmark_sort_key(benchmark):
     """Returns the key that may be used to sort benchmarks by label."""
-    if not "label" in benchmark:
+    if benchmark.label is None:
         return ""
-    return benchmark["label"]
+    return benchmark.label
 
 def plot_scenario(benchmarks, name):
     """Takes a list of parsed benchmark results and a scenario name and
@@ -257,57 +186,60 @@ def plot_scenario(benchmarks, name):
     figure = plot.figure()
     figure.suptitle(name)
     total_timeline = get_total_timeline(benchmarks)
-    min_time = min(total_timeline[0])
-    max_time = max(total_timeline[0])
-    max_resident_threads = benchmarks[0]["max_resident_threads"]
+    min_time = total_timeline[0].min()
+    max_time = total_timeline[0].max()
+    max_resident_threads = benchmarks[0].max_resident_threads
     # Plot each timeline in a separate subplot
     for i in range(len(benchmarks)):
         benchmark = benchmarks[i]
         axes = figure.add_subplot(len(benchmarks), 1, i + 1)
         timeline = get_thread_timeline(benchmark)
         # Make sure all timelines extend to the right end of the plot
-        timeline[0].append(max_time)
-        timeline[1].append(0)
-        max_threads = max(timeline[1])
+        timeline[0] = numpy.append(timeline[0], max_time)
+        timeline[1] = numpy.append(timeline[1], 0)
+        max_threads = timeline[1].max()
         set_axes_dimensions(axes, min_time, max_time, 0, max_threads)
         # Draw the release arrow before (below) the plotted line
-        if "release_time" in benchmark:
-            draw_release_arrow(axes, benchmark["release_time"])
-        axes.plot(timeline[0], timeline[1], color="k", lw=3)
-        label = "%d: %s" % (i + 1, benchmark["benchmark_name"])
-        if "label" in benchmark:
-            label = benchmark["label"]
+        if benchmark.release_time is not None:
+            draw_release_arrow(axes, benchmark.release_time)
+        # Only draw as many points as can be seen at the current zoom level.
+        line, = axes.plot([], [], color="k", lw=3)
+        decimation.DecimatedPlot(axes, timeline[0], timeline[1], line.set_data)
+        label = "%d: %s" % (i + 1, benchmark.benchmark_name)
+        if benchmark.label is not None:
+            label = benchmark.label
         axes.set_ylabel("# threads,\n" + label)
     # Add the X label below the bottommost subplot
     axes.set_xlabel("Time (seconds)")
     return figure
 
-def show_plots(filenames):
-    """Takes a list of filenames, and generates one plot per scenario found in
-    the files."""
-    parsed_files = []
-    for name in filenames:
-        with open(name) as f:
-            parsed_files.append(json.loads(f.read()))
+def show_plots(benchmarks):
+    """Takes a list of BenchmarkLogs, and generates one plot per scenario found
+    in them."""
     # Group the files by scenario
-    scenarios = {}
-    for benchmark in parsed_files:
-        scenario = benchmark["scenario_name"]
-        if not scenario in scenarios:
-            scenarios[scenario] = []
-        scenarios[scenario].append(benchmark)
+    scenarios = benchmark_log.group_by_scenario(benchmarks)
     figures = []
     for scenario in scenarios:
         figures.append(plot_scenario(scenarios[scenario], scenario))
     plot.show()
 
+def export_scenario(benchmarks, name, filenames):
+    """Takes a list of BenchmarkLogs, a scenario name and a list of filenames,
+    and saves the scenario's plot to each file, in the format given by its
+    extension. The figure is closed once it has been saved."""
+    figure = plot_scenario(benchmarks, name)
+    for filename in filenames:
+        figure.savefig(filename)
+    plot.close(figure)
+
 if __name__ == "__main__":
-    base_directory = "./results"
-    if len(sys.argv) > 2:
-        print "Usage: python %s [directory containing results (./results)]" % (
-            sys.argv[0])
-        exit(1)
-    if len(sys.argv) == 2:
-        base_directory = sys.argv[1]
-    filenames = glob.glob(base_directory + "/*.json")
-    show_plots(filenames)
+    parser = viewer_options.get_argument_parser("Shows a timeline of the "
+        "threads running for each benchmark.")
+    viewer_options.add_output_arguments(parser, ["png", "pdf", "svg"])
+    args = parser.parse_args()
+    if args.output_dir is None:
+        show_plots(viewer_options.load_benchmarks(args))
+    else:
+        # Draw without a window, and without keeping any figures open
+        plot.switch_backend("agg")
+        viewer_options.export_scenarios(args, export_scenario)
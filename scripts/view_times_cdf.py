@@ -1,50 +1,39 @@
-import glob
-import json
+import benchmark_log
 import matplotlib.pyplot as plot
 import numpy
-import sys
+import quantile_sketch
+import viewer_options
 
 def convert_values_to_cdf(values):
-    """Takes a 1-D list of values and converts it to a CDF representation."""
+    """Takes a 1-D array of values and converts it to a CDF representation."""
     if len(values) == 0:
         return [[], []]
-    values.sort()
+    values = numpy.sort(values)
     total_size = float(len(values))
-    current_min = values[0]
-    count = 0.0
-    data_list = [values[0]]
-    ratio_list = [0.0]
-    for v in values:
-        count += 1.0
-        if v > current_min:
-            data_list.append(v)
-            ratio_list.append((count / total_size) * 100.0)
-            current_min = v
-    data_list.append(values[-1])
-    ratio_list.append(100)
+    # Each value larger than the one before it adds a point to the CDF, at the
+    # percentage of values up to and including it.
+    new_indices = numpy.nonzero(values[1:] > values[:-1])[0] + 1
+    data_list = numpy.concatenate(([values[0]], values[new_indices],
+        [values[-1]]))
+    ratio_list = numpy.concatenate(([0.0],
+        ((new_indices + 1) / total_size) * 100.0, [100.0]))
     return [data_list, ratio_list]
 
 def get_benchmark_cdf(benchmark, times_key):
-    """Takes a parsed benchmark result JSON file and returns a CDF (in seconds
-    and percentages) of the CPU (total) times for the benchmark. The times_key
-    argument can be used to specify which range of times (in the times array)
-    should be used to calculate the durations to include in the CDF."""
-    raw_values = []
-    for t in benchmark["times"]:
-        if not times_key in t:
-            continue
-        times = t[times_key]
-        for i in range(len(times) / 2):
-            start_index = i * 2
-            end_index = i * 2 + 1
-            raw_values.append(times[end_index] - times[start_index])
-    return convert_values_to_cdf(raw_values)
+    """Takes a BenchmarkLog and returns a CDF (in seconds and percentages) of
+    the CPU (total) times for the benchmark. The times_key argument can be used
+    to specify which range of times (in the times array) should be used to
+    calculate the durations to include in the CDF. The benchmark may also be
+    a LogSketches, in which case the CDF is read from its sketch."""
+    if isinstance(benchmark, quantile_sketch.LogSketches):
+        return benchmark.get_sketch(times_key).get_cdf()
+    return convert_values_to_cdf(benchmark.get_durations(times_key))
 
 def benchmark_sort_key(benchmark):
     """Returns the key that may be used to sort benchmarks by label."""
-    if not "label" in benchmark:
+    if benchmark.label is None:
         return ""
-    return benchmark["label"]
+    return benchmark.label
 
 def plot_scenario(benchmarks, name, times_key):
     """Takes a list of parsed benchmark results and a scenario name and
@@ -58,9 +47,9 @@ def plot_scenario(benchmarks, name, times_key):
     c = 0
     for b in benchmarks:
         c += 1
-        label = "%d: %s" % (c, b["benchmark_name"])
-        if "label" in b:
-            label = b["label"]
+        label = "%d: %s" % (c, b.benchmark_name)
+        if b.label is not None:
+            label = b.label
         labels.append(label)
         cdf_data = get_benchmark_cdf(b, times_key)
         min_value = min(cdf_data[0])
@@ -80,39 +69,45 @@ def plot_scenario(benchmarks, name, times_key):
     axes = figure.add_subplot(1, 1, 1)
     for i in range(len(cdfs)):
         axes.plot(cdfs[i][0], cdfs[i][1], label=labels[i], lw=3)
-    axes.set_xlabel("Time (seconds)")
+    if isinstance(benchmarks[0], quantile_sketch.LogSketches):
+        axes.set_xlabel("Time (seconds, within %g%%)" %
+            (benchmarks[0].relative_accuracy * 100.0))
+    else:
+        axes.set_xlabel("Time (seconds)")
     axes.set_ylabel("% <= X")
     legend = plot.legend()
     legend.draggable()
     return figure
 
-def show_plots(filenames, times_key="block_times"):
-    """Takes a list of filenames, and generates one plot per scenario found in
-    the files. See get_benchmark_cdf for an explanation of the times_key
+def show_plots(benchmarks, times_key="block_times"):
+    """Takes a list of BenchmarkLogs, and generates one plot per scenario found
+    in them. See get_benchmark_cdf for an explanation of the times_key
     argument."""
-    parsed_files = []
-    for name in filenames:
-        with open(name) as f:
-            parsed_files.append(json.loads(f.read()))
     # Group the files by scenario
-    scenarios = {}
-    for benchmark in parsed_files:
-        scenario = benchmark["scenario_name"]
-        if not scenario in scenarios:
-            scenarios[scenario] = []
-        scenarios[scenario].append(benchmark)
+    scenarios = benchmark_log.group_by_scenario(benchmarks)
     figures = []
     for scenario in scenarios:
         figures.append(plot_scenario(scenarios[scenario], scenario, times_key))
     plot.show()
 
+def export_scenario(benchmarks, name, filenames, times_key="block_times"):
+    """Takes a list of BenchmarkLogs, a scenario name and a list of filenames,
+    and saves the scenario's CDF plot to each file, in the format given by its
+    extension. The figure is closed once it has been saved."""
+    figure = plot_scenario(benchmarks, name, times_key)
+    for filename in filenames:
+        figure.savefig(filename)
+    plot.close(figure)
+
 if __name__ == "__main__":
-    base_directory = "./results"
-    if len(sys.argv) > 2:
-        print "Usage: python %s [directory containing results (./results)]" % (
-            sys.argv[0])
-        exit(1)
-    if len(sys.argv) == 2:
-        base_directory = sys.argv[1]
-    filenames = glob.glob(base_directory + "/*.json")
-    show_plots(filenames)
+    parser = viewer_options.get_argument_parser("Shows CDFs of the block "
+        "times of each benchmark.")
+    viewer_options.add_output_arguments(parser, ["png", "pdf", "svg"])
+    viewer_options.add_sketch_argument(parser)
+    args = parser.parse_args()
+    if args.output_dir is None:
+        show_plots(viewer_options.load_benchmarks(args))
+    else:
+        # Draw without a window, and without keeping any figures open
+        plot.switch_backend("agg")
+        viewer_options.export_scenarios(args, export_scenario)
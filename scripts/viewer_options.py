@@ -0,0 +1,228 @@
+# This file contains the command-line handling shared by the viewer scripts.
+# Each viewer takes the directory containing the JSON result files, which must
+# end in .json, along with options controlling how the files are loaded.
+#
+# Usage, from a viewer script:
+#
+#    parser = viewer_options.get_argument_parser("Shows something.")
+#    args = parser.parse_args()
+#    benchmarks = viewer_options.load_benchmarks(args)
+import argparse
+import benchmark_log
+import export_manifest
+import glob
+import log_cache
+import log_index
+import multiprocessing
+import os
+import quantile_sketch
+import re
+import sys
+
+# Increase this whenever changes to the shared loading code change the saved
+# plots, so that every plot is drawn again.
+OUTPUT_VERSION = 1
+
+# The arguments which don't change the contents of saved plots.
+UNSAVED_ARGUMENTS = ["directory", "jobs", "no_cache", "scenario", "output_dir",
+    "format", "default_format", "force"]
+
+def get_argument_parser(description):
+    """Returns an argparse.ArgumentParser with the arguments common to every
+    viewer script. Scripts may add their own arguments before parsing."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("directory", nargs="?", default="./results",
+        help="The directory containing the result files. Default: ./results")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+        help="The number of processes used to load result files. Default: " +
+        "the number of CPUs")
+    parser.add_argument("--no-cache", action="store_true",
+        help="Don't read or update the cache of loaded result files.")
+    parser.add_argument("--scenario", action="append",
+        help="Only show the scenario with the given name. May be given more " +
+        "than once.")
+    parser.add_argument("--label", action="append",
+        help="Only show benchmarks with the given label. May be given more " +
+        "than once.")
+    parser.add_argument("--from", dest="start_time", type=float,
+        help="Only load the kernels running at or after this time, in " +
+        "seconds, as recorded in the result files.")
+    parser.add_argument("--to", dest="end_time", type=float,
+        help="Only load the kernels running at or before this time, in " +
+        "seconds, as recorded in the result files.")
+    return parser
+
+def get_filenames(args):
+    """Returns the paths of the result files in the directory given by the
+    parsed arguments, which match any --scenario or --label filters. Only the
+    headers of the files are read to apply the filters."""
+    filenames = glob.glob(args.directory + "/*.json")
+    if not (args.scenario or args.label):
+        return filenames
+    if args.no_cache:
+        headers = log_index.read_headers(filenames)
+    else:
+        headers = log_index.LogIndex().get_headers(filenames)
+    return log_index.filter_logs(filenames, headers, args.scenario,
+        args.label)
+
+def load_benchmarks(args):
+    """Loads the result files selected by the parsed arguments, and returns a
+    list of BenchmarkLogs. If --from or --to was given, benchmarks without any
+    kernels in the window of time are left out."""
+    return load_files(args, get_filenames(args))
+
+def is_unstarted(log):
+    """Returns True if a BenchmarkLog or LogSketches is from a log which ended
+    before any kernels were recorded, such as one the runner has only just
+    opened. Its header may be incomplete."""
+    return log.truncated and (log.kernel_count() == 0)
+
+def load_files(args, filenames):
+    """Loads the given result files using the options in the parsed arguments,
+    like load_benchmarks. If --sketch was given, LogSketches are returned
+    instead of BenchmarkLogs. Truncated logs without any kernels are left
+    out."""
+    cache = None
+    if not args.no_cache:
+        cache = log_cache.LogCache()
+    if getattr(args, "sketch", False):
+        logs = load_sketches(args, filenames, cache)
+    elif (args.start_time is None) and (args.end_time is None):
+        logs = benchmark_log.load_benchmark_logs(filenames, cache, args.jobs)
+    else:
+        logs = benchmark_log.load_benchmark_logs(filenames, cache, args.jobs,
+            (args.start_time, args.end_time))
+        logs = [b for b in logs if b.kernel_count() != 0]
+    return [log for log in logs if not is_unstarted(log)]
+
+def load_sketches(args, filenames, cache):
+    """Returns the LogSketches of the given result files, leaving out those
+    without any kernels in the window given by --from and --to, if any."""
+    if (args.start_time is None) and (args.end_time is None):
+        return quantile_sketch.load_all_sketches(filenames, cache, args.jobs)
+    logs = quantile_sketch.load_all_sketches(filenames, cache, args.jobs,
+        (args.start_time, args.end_time))
+    return [log for log in logs if log.kernel_count() != 0]
+
+def add_sketch_argument(parser):
+    """Adds the --sketch argument, for scripts which can use the quantile
+    sketches of the result files instead of every duration."""
+    parser.add_argument("--sketch", action="store_true",
+        help="Use sketches of the durations, which are built while loading " +
+        "each result file and take a fixed amount of memory, instead of " +
+        "keeping every duration. Percentiles are then within " +
+        # argparse formats the help with %, so the percent sign is doubled.
+        "%g" % (quantile_sketch.RELATIVE_ACCURACY * 100.0) +
+        "%% of the true values.")
+
+def add_output_arguments(parser, formats):
+    """Adds the arguments for saving each scenario's plot to files instead of
+    showing it. formats lists the file extensions the script can write, with
+    the default first."""
+    parser.add_argument("--output-dir",
+        help="Save the plots to files in this directory instead of showing " +
+        "them. The directory is created if needed.")
+    parser.add_argument("--format", action="append", choices=formats,
+        help="The format of the saved plots. May be given more than once. " +
+        "Default: %s" % formats[0])
+    parser.add_argument("--force", action="store_true",
+        help="Save every plot, even if its result files, the script and its " +
+        "options are unchanged since it was last saved.")
+    parser.set_defaults(default_format=formats[0])
+
+def get_output_filename(directory, scenario, extension):
+    """Returns the path of the file holding the plot of the given scenario in
+    the given format. Characters other than letters, digits, '.', '-' and '_'
+    in the scenario name are replaced by '_'."""
+    name = re.sub(r"[^\w.-]", "_", scenario)
+    return os.path.join(directory, name + "." + extension)
+
+def export_scenario_args(args):
+    """Calls an export function with a tuple of its arguments, for use with a
+    multiprocessing pool."""
+    return args[0](*args[1:])
+
+def get_output_version(args, export_scenario):
+    """Returns a string identifying the script defining export_scenario and
+    the parsed arguments which affect the plots it saves."""
+    module = sys.modules[export_scenario.__module__]
+    with open(module.__file__.replace(".pyc", ".py")) as f:
+        source = f.read()
+    options = sorted((k, v) for k, v in vars(args).items()
+        if not k in UNSAVED_ARGUMENTS)
+    return export_manifest.hash_strings([str(OUTPUT_VERSION),
+        export_scenario.__name__, source, repr(options)])
+
+def export_scenarios(args, export_scenario):
+    """Groups the result files selected by the parsed arguments by scenario,
+    and calls export_scenario with each scenario's BenchmarkLogs, its name and
+    the list of files to write, one per format given by the arguments. The
+    scenarios are exported by a pool of --jobs processes, or one process per
+    CPU, so export_scenario must be defined at the top level of a module.
+
+    Unless --force was given, a scenario is skipped if its files were saved
+    before from the same result files, by the same script with the same
+    options, and its result files aren't loaded. Returns the list of files
+    written."""
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    formats = args.format
+    if not formats:
+        formats = [args.default_format]
+    filenames = get_filenames(args)
+    if args.no_cache:
+        headers = log_index.read_headers(filenames)
+    else:
+        headers = log_index.LogIndex().get_headers(filenames)
+    scenarios = {}
+    for name, header in zip(filenames, headers):
+        scenario = header["scenario_name"]
+        # Logs which ended before their scenario name can't be exported.
+        if scenario is None:
+            continue
+        if not scenario in scenarios:
+            scenarios[scenario] = []
+        scenarios[scenario].append(name)
+    manifest = export_manifest.ExportManifest(args.output_dir)
+    version = get_output_version(args, export_scenario)
+    outputs = {}
+    keys = {}
+    for scenario in sorted(scenarios):
+        names = [get_output_filename(args.output_dir, scenario, f)
+            for f in formats]
+        key = manifest.get_key(version, scenarios[scenario])
+        if args.force or not manifest.is_current(names, key):
+            outputs[scenario] = names
+            keys[scenario] = key
+    manifest.save()
+    # Only load the files of the scenarios to export
+    to_load = []
+    for scenario in sorted(outputs):
+        to_load.extend(scenarios[scenario])
+    benchmarks = benchmark_log.group_by_scenario(load_files(args, to_load))
+    work = []
+    for scenario in sorted(outputs):
+        if scenario in benchmarks:
+            work.append((export_scenario, benchmarks[scenario], scenario,
+                outputs[scenario]))
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(work))
+    if jobs <= 1:
+        for w in work:
+            export_scenario_args(w)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            pool.map(export_scenario_args, work, 1)
+        finally:
+            pool.close()
+            pool.join()
+    written = []
+    for w in work:
+        manifest.record(w[3], keys[w[2]])
+        written.extend(w[3])
+    manifest.save()
+    return written